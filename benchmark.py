@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : benchmark.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:25
+# @Desc  : Benchmark suite on a synthetic corpus, results are written as json
+
+import os
+import sys
+import json
+import time
+import logging
+import shutil
+import argparse
+import warnings
+import contextlib
+import platform
+import tempfile
+import threading
+import subprocess
+import statistics
+
+# plots are only saved, never shown
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from store import DirStore, SqliteStore
+from loader import iter_questions
+from synthetic import generate_corpus, write_corpus
+from stats_index import StatsIndex, STATS_INDEX_FILENAME
+
+CUR_PATH = os.path.dirname(os.path.abspath(__file__))
+BENCHES = ["startup", "fetch", "load", "tokenize", "vocab", "convert", "visualize"]
+CONVERT_METHODS = ["convert", "convert_pairwise", "convert_pairwise_self_sim", "convert_pairwise_table",
+                   "convert_npy", "convert_pairwise_txt"]
+
+# modules an action imports lazily on top of main, keep in sync with main.py
+ACTION_IMPORTS = {
+    "fetch_data": [],
+    "sync": [],
+    "migrate_store": [],
+    "convert_data": ["converter"],
+    "visualize_data": ["plot"],
+    "stats": [],
+}
+HEAVY_MODULES = ["tensorflow", "matplotlib", "numpy", "lxml"]
+
+
+def time_action_import(action: str) -> dict:
+    # import main and the action's modules in a fresh interpreter
+    code = "import sys, time, json\n" \
+           "t = time.perf_counter()\n" \
+           "import main\n" + \
+           "".join(["import {}\n".format(m) for m in ACTION_IMPORTS[action]]) + \
+           "print(json.dumps({{'seconds': time.perf_counter() - t, " \
+           "'heavy': [m for m in {} if m in sys.modules]}}))\n".format(HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=CUR_PATH, stdout=subprocess.PIPE, check=True)
+    return json.loads(out.stdout.decode("utf-8").strip().split("\n")[-1])
+
+
+def time_help() -> float:
+    # whole process, interpreter start up included
+    t = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "-h"], cwd=CUR_PATH, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - t
+
+
+def bench_startup(repeat=5) -> dict:
+    results = {}
+    times = [time_help() for _ in range(repeat)]
+    results["-h"] = {"min": min(times), "median": statistics.median(times), "heavy": []}
+    for action in ACTION_IMPORTS.keys():
+        runs = [time_action_import(action) for _ in range(repeat)]
+        times = [r["seconds"] for r in runs]
+        results[action] = {"min": min(times), "median": statistics.median(times), "heavy": runs[0]["heavy"]}
+    return results
+
+
+def print_startup(results: dict):
+    print("{:<16}{:>10}{:>10}  {}".format("action", "min(s)", "median(s)", "heavy modules"))
+    for action, r in results.items():
+        print("{:<16}{:>10.3f}{:>10.3f}  {}".format(action, r["min"], r["median"], ", ".join(r["heavy"])))
+
+
+def timed(func, repeat=1) -> tuple:
+    # best wall time of repeat runs and the result of the last one
+    best = None
+    rst = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        rst = func()
+        seconds = time.perf_counter() - t
+        best = seconds if best is None else min(best, seconds)
+    return best, rst
+
+
+def throughput(seconds: float, items: int, **kwargs) -> dict:
+    rst = {"seconds": seconds, "items": items, "items_per_second": items / seconds if seconds > 0 else None}
+    rst.update(kwargs)
+    return rst
+
+
+def bench_fetch(num_question: int, concurrency=16, batch_sizes=(1, 20), latency=0.0, seed=0) -> dict:
+    # fetch the synthetic corpus from a stub server running in this process
+    from stub_server import make_server
+    from spider import Spider, AdaptiveRateController
+    from fetcher import AsyncFetcher
+
+    questions = [q['data']['question'] for q in generate_corpus(num_question, seed=seed)]
+    server = make_server(port=0, questions=questions, latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = "http://127.0.0.1:{}/".format(server.server_address[1])
+    pairs = [(int(q['questionId']), q['titleSlug']) for q in questions]
+
+    results = {}
+    for batch_size in batch_sizes:
+        spider = Spider(base_url=base_url, pool_size=concurrency,
+                        rate_controller=AdaptiveRateController(initial_rate=1e6, min_rate=1.0, max_rate=1e6))
+        fetched = []
+        fetcher = AsyncFetcher(spider, concurrency=concurrency)
+        seconds, failed = timed(lambda: fetcher.fetch_all(pairs, on_result=lambda *q: fetched.append(q),
+                                                         batch_size=batch_size))
+        stats = spider.get_connection_stats()
+        spider.close()
+        results["batch_{}".format(batch_size)] = throughput(
+            seconds, len(fetched), failed=len(failed), requests=stats["requests"], connections=stats["opened"])
+    server.shutdown()
+    server.server_close()
+    return results
+
+
+def bench_load(stores: dict, repeat=1) -> dict:
+    from converter import Converter
+    results = {}
+    for name, store in stores.items():
+        seconds, questions = timed(
+            lambda: list(iter_questions(store, free_only=True, fields=Converter.question_fields)), repeat)
+        results[name] = throughput(seconds, len(questions))
+    return results
+
+
+def bench_tokenize(questions: list, repeat=1) -> dict:
+    from util import clean_html, clean_empty_lines, clean_text_batch
+    from tokenizer import Tokenizer, FastTokenizer, get_token_pattern
+
+    contents = [q['data']['question']['content'] for q in questions]
+    results = {}
+    seconds, texts = timed(lambda: [clean_html(c) for c in contents], repeat)
+    results["clean_html"] = throughput(seconds, len(contents), bytes=sum([len(c) for c in contents]))
+    seconds, texts = timed(lambda: [clean_empty_lines(t) for t in texts], repeat)
+    results["clean_empty_lines"] = throughput(seconds, len(texts))
+    seconds, clean_texts = timed(lambda: clean_text_batch(contents), repeat)
+    results["clean_text"] = throughput(seconds, len(contents), bytes=sum([len(c) for c in contents]))
+    assert clean_texts == texts
+    # the token pattern is compiled once per process, not part of tokenizing
+    get_token_pattern()
+    seconds, tokens = timed(lambda: [Tokenizer(t).tokenize() for t in texts], repeat)
+    results["Tokenizer"] = throughput(seconds, len(texts), tokens=sum([len(t) for t in tokens]))
+    seconds, tokens = timed(lambda: [FastTokenizer(t).tokenize() for t in texts], repeat)
+    results["FastTokenizer"] = throughput(seconds, len(texts), tokens=sum([len(t) for t in tokens]))
+    return results
+
+
+def bench_vocab(questions: list, workers=1, repeat=1) -> dict:
+    from converter import Converter
+    converter = Converter(questions)
+    results = {}
+    seconds, _ = timed(lambda: converter.preprocess(workers=workers), repeat)
+    results["preprocess"] = throughput(seconds, len(questions), workers=workers)
+    seconds, word2id = timed(lambda: converter.create_word2id(), repeat)
+    results["dict"] = throughput(seconds, len(converter.words), vocab_size=len(word2id))
+    seconds, word2id = timed(lambda: converter.create_word2id(min_count=2, max_size=10000), repeat)
+    results["dict_pruned"] = throughput(seconds, len(converter.words), vocab_size=len(word2id))
+    seconds, _ = timed(lambda: converter.build_token_ids(), 1)
+    results["build_token_ids"] = throughput(seconds, len(questions))
+
+    hashed = Converter(questions)
+    hashed.use_hashed_vocab(65536)
+    seconds, _ = timed(lambda: hashed.preprocess(workers=workers), repeat)
+    results["hashed_preprocess"] = throughput(seconds, len(questions), workers=workers)
+    return results
+
+
+def bench_convert(questions: list, dest: str, workers=1, seed=0, repeat=1) -> dict:
+    from converter import Converter
+    converter = Converter(questions)
+    converter.preprocess(workers=workers)
+    converter.create_word2id()
+    converter.build_token_ids()
+    results = {}
+    for method in CONVERT_METHODS:
+        path = os.path.join(dest, method)
+        os.makedirs(path)
+        kwargs = {"seed": seed}
+        if method not in ["convert_npy", "convert_pairwise_txt"]:
+            kwargs["workers"] = workers
+        if method == "convert_npy":
+            kwargs = {"limit_length": 512}
+        seconds, summary = timed(lambda: getattr(converter, method)(path, **kwargs), repeat)
+        num_bytes = sum([os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)])
+        items = summary.get("examples", summary.get("triples", summary.get("relations", summary.get("questions"))))
+        results[method] = throughput(seconds, items, bytes=num_bytes)
+        shutil.rmtree(path)
+    return results
+
+
+def bench_visualize(store, plot_path: str, repeat=1) -> dict:
+    import main
+    # keep the report and missing font warnings out of the benchmark output,
+    # matplotlib reports missing fonts through logging rather than warnings
+    font_logger = logging.getLogger("matplotlib.font_manager")
+    level = font_logger.level
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        font_logger.setLevel(logging.ERROR)
+        try:
+            seconds, _ = timed(lambda: main.visualize_store(store, plot_path), repeat)
+        finally:
+            font_logger.setLevel(level)
+    results = {"visualize_store": throughput(seconds, len(store))}
+
+    # the stats index of visualize_data and stats: built once, then loaded instead of the raw json
+    filename = os.path.join(plot_path, STATS_INDEX_FILENAME)
+
+    def build_index():
+        index = StatsIndex()
+        index.refresh(store)
+        index.save(filename)
+        return index
+
+    seconds, index = timed(build_index, repeat)
+    results["stats_index_build"] = throughput(seconds, len(index), bytes=os.path.getsize(filename))
+    seconds, _ = timed(lambda: StatsIndex(filename).summary(), repeat)
+    results["stats_index_summary"] = throughput(seconds, len(index))
+    return results
+
+
+def run_size(num_question: int, benches: list, seed=0, workers=1, repeat=1, fetch_questions=1000,
+             fetch_concurrency=16) -> dict:
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="leetcode_bench_")
+    try:
+        if "fetch" in benches:
+            # fetching goes through http, keep it to a bounded number of questions
+            results["fetch"] = bench_fetch(min(num_question, fetch_questions), concurrency=fetch_concurrency,
+                                           seed=seed)
+        stores = {
+            "dir": DirStore(os.path.join(tmp, "dir")),
+            "sqlite": SqliteStore(os.path.join(tmp, "raw.sqlite3")),
+        }
+        if "load" in benches or "visualize" in benches:
+            for store in stores.values():
+                write_corpus(store, num_question, seed=seed)
+        if "load" in benches:
+            results["load"] = bench_load(stores, repeat=repeat)
+        if "visualize" in benches:
+            plot_path = os.path.join(tmp, "plots")
+            os.makedirs(plot_path)
+            results["visualize"] = bench_visualize(stores["sqlite"], plot_path, repeat=repeat)
+        for store in stores.values():
+            store.close()
+
+        questions = [q for q in generate_corpus(num_question, seed=seed) if not q['data']['question']['isPaidOnly']]
+        if "tokenize" in benches:
+            results["tokenize"] = bench_tokenize(questions, repeat=repeat)
+        if "vocab" in benches:
+            results["vocab"] = bench_vocab(questions, workers=workers, repeat=repeat)
+        if "convert" in benches:
+            results["convert"] = bench_convert(questions, os.path.join(tmp, "convert"), workers=workers, seed=seed,
+                                               repeat=repeat)
+    finally:
+        shutil.rmtree(tmp)
+    return results
+
+
+def print_results(num_question: int, results: dict):
+    print("{} questions".format(num_question))
+    print("  {:<12}{:<28}{:>10}{:>12}{:>14}".format("bench", "name", "seconds", "items", "items/s"))
+    for bench, rst in results.items():
+        for name, r in rst.items():
+            print("  {:<12}{:<28}{:>10.3f}{:>12}{:>14.1f}".format(
+                bench, name, r["seconds"], r["items"], r["items_per_second"] or 0.0))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--num_question",
+        "-n",
+        help="Set synthetic corpus sizes to benchmark, e.g. -n 1000 10000 100000. Default: 1000",
+        type=int,
+        nargs="+",
+        default=[1000],
+    )
+    parser.add_argument(
+        "--benches",
+        "-b",
+        help="Set benchmarks to run. Default: all of " + ", ".join(BENCHES),
+        type=str,
+        nargs="+",
+        default=BENCHES,
+        choices=BENCHES,
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        help="Set number of runs per measurement, the best one is reported. Default: 1 (5 for startup)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        help="Set number of worker processes for preprocessing and converting. Default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--seed",
+        help="Set seed of the synthetic corpus and of negative sampling. Default: 0",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--fetch_questions",
+        help="Set max number of questions fetched from the stub server. Default: 1000",
+        type=int,
+        default=1000,
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        help="Set number of concurrent requests of the fetch benchmark. Default: 16",
+        type=int,
+        default=16,
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        help="Set json file to write the results to. Default: None",
+        type=str,
+        default=None,
+    )
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "workers": args.workers,
+        },
+    }
+    if "startup" in args.benches:
+        results["startup"] = bench_startup(repeat=5 if args.repeat is None else args.repeat)
+        print_startup(results["startup"])
+    results["sizes"] = {}
+    for num_question in args.num_question:
+        rst = run_size(num_question, args.benches, seed=args.seed, workers=args.workers,
+                       repeat=1 if args.repeat is None else args.repeat,
+                       fetch_questions=args.fetch_questions, fetch_concurrency=args.concurrency)
+        results["sizes"][str(num_question)] = rst
+        print_results(num_question, rst)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
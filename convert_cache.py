@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : convert_cache.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:48
+# @Desc  : Persistent content-hash cache of cleaned, tokenized and encoded questions for convert_data
+
+import sqlite3
+import hashlib
+import unicodedata
+
+import lxml.etree
+
+CONVERT_CACHE_FILENAME = "_convert_cache.sqlite3"
+# bump whenever cleaning, tokenizing or feature encoding gives a different output
+CONVERT_CACHE_VERSION = 1
+
+
+def get_sha1(*parts) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+        # length prefixed, so ("ab", "c") and ("a", "bc") differ
+        h.update(str(len(data)).encode('ascii') + b':' + data)
+    return h.hexdigest()
+
+
+def get_words_version(words) -> str:
+    # version of a word2id or tag2id, ids are given by the order of the words
+    return get_sha1('\n'.join(words))
+
+
+class ConvertCache(object):
+    """
+    Two sqlite tables keyed by content hashes:
+    texts: cleaned text and lower-cased tokens of a question content, keyed by the content and
+    the cleaner version (cache version, libxml2 version, whose html handling defines the text,
+    and unicode version, which defines the tokens).
+    features: encoded Text, Tokens and Tags features of a question, keyed by its text key, its tags,
+    the vocabulary and tag list versions and the length limit.
+    Every run stamps the entries it uses, prune() drops the entries of questions that no
+    longer exist, the features this run encoded again, and then the least recently used
+    entries until the cache fits max_bytes.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        # pages freed by prune() are given back to the file system, only has an effect on a new file
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS texts ("
+                          "key TEXT PRIMARY KEY, "
+                          "text BLOB NOT NULL, "
+                          "tokens TEXT NOT NULL, "
+                          "used INTEGER NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS features ("
+                          "key TEXT PRIMARY KEY, "
+                          "text_key TEXT NOT NULL, "
+                          "text BLOB NOT NULL, "
+                          "tokens BLOB NOT NULL, "
+                          "tags BLOB NOT NULL, "
+                          "used INTEGER NOT NULL)")
+        # run counter, the recency of an entry is the last run that used it
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'run'").fetchone()
+        self.run = 1 if row is None else row[0] + 1
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('run', ?)", (self.run,))
+        self.conn.commit()
+        # the token pattern is built from str.isalpha() of the running interpreter, i.e. its unicode version
+        self.cleaner_version = "{}-libxml2-{}-unicode-{}".format(
+            CONVERT_CACHE_VERSION, ".".join([str(v) for v in lxml.etree.LIBXML_VERSION]),
+            unicodedata.unidata_version)
+        self.hits = 0
+        self.misses = 0
+        self.features_used = False  # whether this run looked up features, npy output does not
+
+    def get_text_key(self, content: str) -> str:
+        return get_sha1(self.cleaner_version, content)
+
+    @staticmethod
+    def get_feature_key(text_key: str, tags: list, vocab_version: str, tag_version: str, limit_length=None) -> str:
+        return get_sha1(text_key, '\n'.join(tags), vocab_version, tag_version, limit_length)
+
+    def select(self, table: str, columns: str, keys: list) -> dict:
+        # key -> row of the given columns, for the keys found; found rows are stamped with this run
+        rows = dict()
+        keys = list(set(keys))
+        # stay below the sqlite limit of bound parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ",".join(["?"] * len(chunk))
+            for row in self.conn.execute("SELECT key, {} FROM {} WHERE key IN ({})".format(columns, table, marks),
+                                         chunk):
+                rows[row[0]] = row[1:]
+            self.conn.execute("UPDATE {} SET used = ? WHERE key IN ({})".format(table, marks), [self.run] + chunk)
+        self.conn.commit()
+        return rows
+
+    def get_texts(self, keys: list) -> dict:
+        # key -> (cleaned text as utf-8 bytes, tokens)
+        rows = self.select("texts", "text, tokens", keys)
+        self.hits += len(rows)
+        self.misses += len(set(keys)) - len(rows)
+        # tokens never contain whitespace
+        return {k: (bytes(text), tokens.split(' ') if tokens != '' else []) for k, (text, tokens) in rows.items()}
+
+    def put_texts(self, items):
+        # (key, text bytes, tokens) triples
+        self.conn.executemany("INSERT OR REPLACE INTO texts (key, text, tokens, used) VALUES (?, ?, ?, ?)",
+                              [(k, text, ' '.join(tokens), self.run) for k, text, tokens in items])
+        self.conn.commit()
+
+    def get_features(self, keys: list) -> dict:
+        # key -> (encoded Text, Tokens, Tags features)
+        self.features_used = True
+        rows = self.select("features", "text, tokens, tags", keys)
+        self.hits += len(rows)
+        self.misses += len(set(keys)) - len(rows)
+        return {k: tuple([bytes(v) for v in row]) for k, row in rows.items()}
+
+    def put_features(self, items):
+        # (key, text key, (encoded Text, Tokens, Tags features)) triples
+        self.conn.executemany("INSERT OR REPLACE INTO features (key, text_key, text, tokens, tags, used) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              [(k, text_key, text, tokens, tags, self.run)
+                               for k, text_key, (text, tokens, tags) in items])
+        self.conn.commit()
+
+    def get_size(self) -> int:
+        # bytes of cached data, sqlite overhead not included
+        return (self.conn.execute("SELECT COALESCE(SUM(LENGTH(text) + LENGTH(tokens)), 0) FROM texts").fetchone()[0] +
+                self.conn.execute("SELECT COALESCE(SUM(LENGTH(text) + LENGTH(tokens) + LENGTH(tags)), 0) "
+                                  "FROM features").fetchone()[0])
+
+    def prune(self, text_keys, max_bytes=None) -> int:
+        """
+        Drop the entries whose content is not in text_keys, i.e. of questions removed or changed
+        since. If this run used features, also drop the features it did not use, e.g. those
+        encoded with an older vocabulary. Then drop the least recently used entries until at most max_bytes are cached.
+        Returns the number of dropped entries.
+        """
+        live = set(text_keys)
+        dropped = []
+        for (key,) in self.conn.execute("SELECT key FROM texts").fetchall():
+            if key not in live:
+                dropped.append(("texts", key))
+        for key, text_key, used in self.conn.execute("SELECT key, text_key, used FROM features").fetchall():
+            # features of a live question not used by a run that used features are outdated
+            if text_key not in live or (self.features_used and used < self.run):
+                dropped.append(("features", key))
+        for table, key in dropped:
+            self.conn.execute("DELETE FROM {} WHERE key = ?".format(table), (key,))
+        if max_bytes is not None:
+            size = self.get_size()
+            if size > max_bytes:
+                rows = self.conn.execute(
+                    "SELECT 'texts', key, LENGTH(text) + LENGTH(tokens), used FROM texts UNION ALL "
+                    "SELECT 'features', key, LENGTH(text) + LENGTH(tokens) + LENGTH(tags), used FROM features "
+                    "ORDER BY used").fetchall()
+                for table, key, nbytes, _ in rows:
+                    if size <= max_bytes:
+                        break
+                    self.conn.execute("DELETE FROM {} WHERE key = ?".format(table), (key,))
+                    dropped.append((table, key))
+                    size -= nbytes
+        self.conn.commit()
+        if len(dropped) > 0:
+            # executescript() runs the pragma to completion, execute() frees a single page
+            self.conn.executescript("PRAGMA incremental_vacuum;")
+        return len(dropped)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -5,15 +5,31 @@
 # @Date  : 2019/3/29 下午4:27
 # @Desc  : Converter to convert leetcode data to TFRecords
 
-import tensorflow as tf
 import json
-import random
+import itertools
+import functools
+import multiprocessing
+from array import array
+import numpy as np
+from collections import Counter
 
 from util import *
-from tokenizer import Tokenizer
+from tokenizer import FastTokenizer
+from record_writer import ShardedRecordWriter
+from sampler import NegativeSampler
+from vocab import Vocabulary, HashedVocabulary
+from convert_cache import ConvertCache, get_words_version
+from tfrecord import ExampleEncoder, BYTES, INT64, FEATURE
+from profiler import profiler
+
+# pivots whose negatives are drawn by one sampler, block b of question ids is seeded with [seed, b]
+SAMPLE_BLOCK_SIZE = 256
 
 
 class Converter(object):
+    # question fields used by the converter, loaders may drop the rest
+    question_fields = ['titleSlug', 'content', 'topicTags', 'similarQuestions']
+
     def __init__(self, question_list: list):
         self.question_list = question_list.copy()
         self.question_list.reverse()
@@ -21,10 +37,138 @@ class Converter(object):
         self.tags = set()
         self.tag2id = dict()
         self.words = set()
-        self.word2id = dict()
+        self.vocab = Vocabulary()
+        self.word2id = self.vocab.word2id
+        # preprocessing cache, indexed by question id (position in question_list)
+        self.texts = []  # cleaned text as utf-8 bytes
+        self.tokens = []  # lower-cased tokens, not kept with a hashed vocabulary
+        self.token_ids = []  # token id arrays, rebuilt whenever word2id changes
+        self.counts = Counter()  # token counts, collected while tokenizing
+        self.token_limit = None  # number of tokens kept per question by preprocess(), None for all of them
+        # optional persistent ConvertCache, and what this run took from or put into it
+        self.cache = None
+        self.text_keys = []  # cache key of every content, indexed by question id
+        self.encoded = dict()  # limit_length -> {qid: encoded Text, Tokens and Tags features}
+
+    def __getstate__(self):
+        # worker processes never use the cache, sqlite connections cannot be pickled
+        state = self.__dict__.copy()
+        state['cache'] = None
+        return state
+
+    def use_cache(self, cache: ConvertCache):
+        # take unchanged questions from cache instead of cleaning, tokenizing and encoding them again
+        self.cache = cache
+        self.texts.clear()
+        self.encoded.clear()
 
     def add_question(self, question: object):
         self.question_list.append(question)
+        self.texts.clear()
+
+    def preprocess(self, workers=1, limit_length=None):
+        """
+        Clean and tokenize every question exactly once, unchanged ones are taken from the cache.
+        With limit_length, tokenizing stops after the first limit_length tokens of a question.
+        Only done for a vocabulary that is not built from the token counts, i.e. hashed or
+        loaded by load_vocab(), and without a cache, whose entries hold every token.
+        """
+        hashed = isinstance(self.vocab, HashedVocabulary)
+        if self.cache is not None or not (hashed or len(self.word2id) > 0):
+            limit_length = None
+        self.token_limit = limit_length
+        self.texts.clear()
+        self.tokens.clear()
+        self.token_ids.clear()
+        self.counts.clear()
+        self.encoded.clear()
+        contents = [q['data']['question']['content'] for q in self.question_list]
+        if self.cache is not None:
+            self.text_keys = [self.cache.get_text_key(c) for c in contents]
+            cached = self.cache.get_texts(self.text_keys)
+            # each content missing from the cache is preprocessed once
+            missing = dict()
+            for k, c in zip(self.text_keys, contents):
+                if k not in cached:
+                    missing[k] = c
+            rst = self.preprocess_contents(preprocess_content, list(missing.values()), workers=workers)
+            self.cache.put_texts([(k, text, tokens) for k, (text, tokens) in zip(missing.keys(), rst)])
+            cached.update(zip(missing.keys(), rst))
+            rst = [cached[k] for k in self.text_keys]
+            if hashed:
+                with profiler.stage("vocab", items=len(rst)):
+                    rst = [(text, array('q', self.vocab.encode(tokens))) for text, tokens in rst]
+        elif hashed:
+            # ids do not depend on the rest of the corpus, encode right away
+            rst = self.preprocess_contents(functools.partial(encode_content, vocab=self.vocab,
+                                                             limit_length=limit_length),
+                                           contents, workers=workers)
+        else:
+            rst = self.preprocess_contents(functools.partial(preprocess_content, limit_length=limit_length),
+                                           contents, workers=workers)
+        for text, tokens in rst:
+            self.texts.append(text)
+            if hashed:
+                self.token_ids.append(tokens)
+            else:
+                self.tokens.append(tokens)
+                if limit_length is None:
+                    self.counts.update(tokens)
+
+    @staticmethod
+    def preprocess_contents(func, contents: list, workers=1) -> list:
+        # func over contents, in chunks over worker processes with workers > 1
+        if workers <= 1 or len(contents) == 0:
+            return [func(c) for c in contents]
+        chunksize = max(len(contents) // (workers * 4), 1)
+        tasks = [(func, contents[i:i + chunksize], profiler.enabled) for i in range(0, len(contents), chunksize)]
+        rst = []
+        with multiprocessing.Pool(workers) as pool:
+            for chunk_rst, state in pool.map(preprocess_chunk, tasks):
+                rst.extend(chunk_rst)
+                if state is not None:
+                    profiler.merge(state)
+        return rst
+
+    def get_token_counts(self) -> dict:
+        # {slug: number of tokens} of every question, for the statistics index
+        if len(self.texts) != len(self.question_list):
+            self.preprocess()
+        if self.token_limit is not None:
+            # only the first tokens of each question are known
+            return dict()
+        counts = self.token_ids if len(self.token_ids) == len(self.texts) else self.tokens
+        return {q['data']['question']['titleSlug']: len(c) for q, c in zip(self.question_list, counts)}
+
+    def get_text(self, qid: int) -> bytes:
+        if len(self.texts) != len(self.question_list):
+            self.preprocess()
+        return self.texts[qid]
+
+    def build_token_ids(self):
+        if len(self.texts) != len(self.question_list):
+            self.preprocess()
+        if len(self.token_ids) != len(self.texts) and len(self.tokens) != len(self.texts):
+            # tokens were dropped by a hashed preprocess, tokenize again
+            self.preprocess(limit_length=self.token_limit)
+        if len(self.token_ids) != len(self.texts):
+            # words missing from the vocabulary map to <UNK>
+            with profiler.stage("vocab", items=len(self.tokens)):
+                self.token_ids = [array('q', self.vocab.encode(tokens)) for tokens in self.tokens]
+
+    def get_token_ids(self, qid: int, limit_length=None) -> array:
+        if len(self.texts) != len(self.question_list):
+            self.preprocess()
+        # we assume that self.word2id is valid
+        assert len(self.word2id) > 0
+        assert limit_length is None or (isinstance(limit_length, int) and limit_length >= 0)
+        if self.token_limit is not None and (limit_length is None or limit_length > self.token_limit):
+            # more tokens are needed than preprocess() kept
+            self.preprocess()
+        self.build_token_ids()
+        if limit_length is None:
+            return self.token_ids[qid]
+        return self.token_ids[qid][:limit_length]
 
     def create_question2id(self) -> dict:
         self.question2id.clear()
@@ -43,6 +187,7 @@ class Converter(object):
                 self.tags.add(t['slug'])
 
         self.tag2id.clear()
+        self.encoded.clear()
         # insert special tags
         self.tag2id["<PAD>"] = 0
         # normal id starts from 1
@@ -52,45 +197,60 @@ class Converter(object):
             tid += 1
         return self.tag2id
 
-    def create_word2id(self) -> dict:
-        # init word set
+    def create_word2id(self, min_count=1, max_size=None) -> dict:
+        # tokens are counted by preprocess(), no extra pass over the contents
+        if (len(self.texts) != len(self.question_list) or len(self.tokens) != len(self.texts) or
+                self.token_limit is not None):
+            self.vocab = Vocabulary()
+            self.preprocess()
+        self.words = set(self.counts.keys())
+        self.vocab = Vocabulary(self.counts)
+        self.word2id = self.vocab.build(min_count=min_count, max_size=max_size)
+        # cached token ids refer to the old vocabulary
+        self.token_ids.clear()
+        self.encoded.clear()
+        return self.word2id
+
+    def load_vocab(self, filename: str) -> dict:
+        # reuse the vocabulary of an earlier conversion instead of building a new one
+        if filename.endswith(".json"):
+            return self.use_hashed_vocab(HashedVocabulary.load(filename).num_buckets)
+        self.vocab = Vocabulary.load(filename)
+        self.words = set(self.vocab.word2id.keys()) - {"<PAD>", "<UNK>"}
+        self.word2id = self.vocab.word2id
+        self.token_ids.clear()
+        self.encoded.clear()
+        return self.word2id
+
+    def use_hashed_vocab(self, num_buckets: int) -> dict:
+        # hash words into num_buckets ids, call before preprocess() to skip keeping tokens
+        self.vocab = HashedVocabulary(num_buckets)
         self.words.clear()
-        for q in self.question_list:
-            tokens = Converter.tokenize_raw_text(q['data']['question']['content'])
-            for t in tokens:
-                self.words.add(t.lower())
-
-        self.word2id.clear()
-        # insert special tokens
-        self.word2id["<PAD>"] = 0
-        self.word2id["<UNK>"] = 1
-
-        # normal token id starts from 2
-        wid = 2
-        for w in sorted(self.words):
-            self.word2id[w] = wid
-            wid += 1
+        self.word2id = self.vocab.word2id
+        self.token_ids.clear()
+        self.encoded.clear()
         return self.word2id
 
     @staticmethod
     def tokenize_raw_text(raw_text: str) -> list:
-        tokenizer = Tokenizer(clean_empty_lines(clean_html(raw_text)))
+        tokenizer = FastTokenizer(clean_text(raw_text))
         return tokenizer.tokenize()
 
     def tokenize_raw_text_to_id(self, raw_text: str, limit_length=None) -> list:
         # we assume that self.word2id is valid
         assert len(self.word2id) > 0
         assert limit_length is None or (isinstance(limit_length, int) and limit_length >= 0)
-        rst = [self.word2id[t.lower()] for t in Converter.tokenize_raw_text(raw_text=raw_text)]
-        if limit_length is None:
-            return rst
-        else:
-            return rst[:limit_length]
+        tokens = FastTokenizer(clean_text(raw_text)).iter_tokens()
+        if limit_length is not None:
+            # stop tokenizing as soon as enough ids are produced
+            tokens = itertools.islice(tokens, limit_length)
+        return self.vocab.encode([t.lower() for t in tokens])
 
     def write_metadata(self, dest: str,
                        question_list_filename="question_list.txt",
                        tag_list_filename="tag_list.txt",
-                       word_list_filename="word_list.txt"):
+                       word_list_filename="word_list.txt",
+                       vocab_hash_filename="vocab_hash.json"):
         # create question list on need
         if len(self.question2id) == 0:
             self.create_question2id()
@@ -106,8 +266,263 @@ class Converter(object):
         # create word list on need
         if len(self.word2id) == 0:
             self.create_word2id()
-        with open(os.path.join(dest, word_list_filename), "w") as f:
-            f.writelines([w + "\n" for w in self.word2id.keys()])
+        if isinstance(self.vocab, HashedVocabulary):
+            # there is no word list, record how words are hashed instead
+            self.vocab.save(os.path.join(dest, vocab_hash_filename))
+        else:
+            self.vocab.save(os.path.join(dest, word_list_filename))
+
+    def get_limit_question_ids(self, limit_question=None) -> range:
+        assert limit_question is None or (
+                isinstance(limit_question, int) and 0 <= limit_question <= len(self.question_list))
+        if limit_question is None:
+            return range(len(self.question_list))
+        return range(limit_question)
+
+    def get_similar_question_ids(self, qid: int) -> list:
+        sim_qs = json.loads(self.question_list[qid]['data']['question']['similarQuestions'])
+        sim_qs_id = []
+        for sq in sim_qs:
+            if sq['titleSlug'] in self.question2id:
+                sim_qs_id.append(self.question2id[sq['titleSlug']])
+        return sim_qs_id
+
+    def get_question_features(self, qid: int, limit_length=None) -> list:
+        # (kind, values) of the Text, Tokens and Tags features of a question
+        topic_tags = self.question_list[qid]['data']['question']['topicTags']
+        return [
+            (BYTES, [self.get_text(qid)]),
+            (INT64, self.get_token_ids(qid, limit_length=limit_length)),
+            (INT64, [self.tag2id[t['slug']] for t in topic_tags]),
+        ]
+
+    def get_example_features(self, qid: int, limit_length=None, question_features=None) -> dict:
+        if question_features is None:
+            question_features = self.get_question_features
+        text, tokens, tags = question_features(qid, limit_length=limit_length)
+        return {
+            'Text': text,
+            'Tokens': tokens,
+            'Tags': tags,
+            'Similar Questions': (INT64, self.get_similar_question_ids(qid)),
+        }
+
+    def get_pairwise_example_features(self, qid: int, sim_qid: int, dis_qid: int, limit_length=None,
+                                      question_features=None) -> dict:
+        # question_features may return features already encoded, see iter_examples()
+        if question_features is None:
+            question_features = self.get_question_features
+        text, tokens, tags = question_features(qid, limit_length=limit_length)
+        sim_text, sim_tokens, sim_tags = question_features(sim_qid, limit_length=limit_length)
+        dis_text, dis_tokens, dis_tags = question_features(dis_qid, limit_length=limit_length)
+        return {
+            # pivot question
+            'Text': text,
+            'Tokens': tokens,
+            'Tags': tags,
+            # similar question
+            'Similar Question Text': sim_text,
+            'Similar Question Tokens': sim_tokens,
+            'Similar Question Tags': sim_tags,
+            # dissimilar question
+            'Dissimilar Question Text': dis_text,
+            'Dissimilar Question Tokens': dis_tokens,
+            'Dissimilar Question Tags': dis_tags,
+        }
+
+    def get_table_example_features(self, qid: int, limit_length=None, question_features=None) -> dict:
+        # one row of the question table, pairwise triples refer to it by Id
+        if question_features is None:
+            question_features = self.get_question_features
+        text, tokens, tags = question_features(qid, limit_length=limit_length)
+        return {
+            'Id': (INT64, [qid]),
+            'Text': text,
+            'Tokens': tokens,
+            'Tags': tags,
+        }
+
+    def get_example(self, qid: int, limit_length=None) -> 'tf.train.Example':
+        # tensorflow is not needed for converting, only for these tf.train.Example getters
+        from tf_util import tf_example
+        return tf_example(self.get_example_features(qid, limit_length=limit_length))
+
+    def get_pairwise_example(self, qid: int, sim_qid: int, dis_qid: int, limit_length=None) -> 'tf.train.Example':
+        from tf_util import tf_example
+        return tf_example(self.get_pairwise_example_features(qid, sim_qid, dis_qid, limit_length=limit_length))
+
+    def get_table_example(self, qid: int, limit_length=None) -> 'tf.train.Example':
+        from tf_util import tf_example
+        return tf_example(self.get_table_example_features(qid, limit_length=limit_length))
+
+    def get_vocab_version(self) -> str:
+        if isinstance(self.vocab, HashedVocabulary):
+            return json.dumps(self.vocab.get_params(), sort_keys=True)
+        return get_words_version(self.word2id.keys())
+
+    def load_encoded_features(self, limit_length=None):
+        # encoded Text, Tokens and Tags of every question for iter_examples(), taken from the cache
+        # for the questions whose content, tags, vocabulary and tag list did not change
+        if self.cache is None or limit_length in self.encoded:
+            return
+        if len(self.texts) != len(self.question_list):
+            self.preprocess()
+        self.build_token_ids()
+        vocab_version = self.get_vocab_version()
+        tag_version = get_words_version(self.tag2id.keys())
+        keys = [ConvertCache.get_feature_key(self.text_keys[qid],
+                                             [t['slug'] for t in q['data']['question']['topicTags']],
+                                             vocab_version, tag_version, limit_length=limit_length)
+                for qid, q in enumerate(self.question_list)]
+        cached = self.cache.get_features(keys)
+        missing = []
+        encoded = dict()
+        with profiler.stage("serialize") as timer:
+            for qid, k in enumerate(keys):
+                features = cached.get(k)
+                if features is None:
+                    features = tuple([ExampleEncoder.encode_feature(kind, values)
+                                      for kind, values in self.get_question_features(qid, limit_length=limit_length)])
+                    cached[k] = features
+                    missing.append((k, self.text_keys[qid], features))
+                encoded[qid] = [(FEATURE, f) for f in features]
+            timer.add(items=len(missing))
+        self.cache.put_features(missing)
+        self.encoded[limit_length] = encoded
+
+    def iter_pairwise_triples(self, qids, num_negative_sample=5, self_sim=False, seed=None):
+        """
+        Yield (pivot, similar, dissimilar) question id triples for the pivots in qids, in order.
+        With self_sim, every pivot is its own similar question and its real similar
+        questions are excluded from the negatives, otherwise pivots without similar
+        questions are skipped.
+        Negatives are drawn without replacement per pivot, by one sampler per block of
+        SAMPLE_BLOCK_SIZE question ids seeded with [seed, block]. The triples of a pivot
+        thus do not depend on how the pivots are split over workers.
+        """
+        # ids shadowed by a duplicate slug are not in question2id and never sampled
+        unused_qids = set(range(len(self.question_list))) - set(self.question2id.values())
+        block = None
+        sampler = None
+        for qid in qids:
+            if qid // SAMPLE_BLOCK_SIZE != block:
+                block = qid // SAMPLE_BLOCK_SIZE
+                sampler = NegativeSampler(len(self.question_list), seed=None if seed is None else [seed, block])
+            q = self.question_list[qid]
+            sim_qs = json.loads(q['data']['question']['similarQuestions'])
+            real_sim_qids = sorted(set([self.question2id[sq['titleSlug']] for sq in sim_qs
+                                        if sq['titleSlug'] in self.question2id]))
+            if self_sim:
+                # similar question is the same as itself
+                sim_qids = [self.question2id[q['data']['question']['titleSlug']]]
+                exclude = unused_qids | set(sim_qids) | set(real_sim_qids)
+            else:
+                # only use questions that have similar questions
+                if len(sim_qs) == 0:
+                    continue
+                sim_qids = real_sim_qids
+                exclude = unused_qids | set(sim_qids)
+
+            # create pairs, negatives of all similar questions are drawn at once so they never repeat
+            with profiler.stage("sample", items=len(sim_qids) * num_negative_sample):
+                neg_qids = sampler.sample(len(sim_qids) * num_negative_sample, exclude)
+            for i, sim_qid in enumerate(sim_qids):
+                for dis_qid in neg_qids[i * num_negative_sample:(i + 1) * num_negative_sample]:
+                    yield qid, sim_qid, dis_qid
+
+    def iter_examples(self, method: str, qids, num_negative_sample=5, limit_length=None, seed=None):
+        # serialized examples of a convert method for the pivots in qids
+        encoder = ExampleEncoder()
+        # encoded question features, all of them when loaded from the cache by load_encoded_features()
+        encoded = self.encoded.get(limit_length, dict())
+        # in pairwise examples a question shows up many times, encode its features only once
+        keep = method in ["pairwise", "pairwise_self_sim"]
+
+        def question_features(qid: int, limit_length=None) -> list:
+            features = encoded.get(qid)
+            if features is None:
+                features = [(FEATURE, encoder.encode_feature(kind, values))
+                            for kind, values in self.get_question_features(qid, limit_length=limit_length)]
+                if keep:
+                    encoded[qid] = features
+            return features
+
+        if method == "normal":
+            get_features = functools.partial(self.get_example_features, limit_length=limit_length,
+                                             question_features=question_features)
+            items = ((qid,) for qid in qids)
+        elif method == "table":
+            get_features = functools.partial(self.get_table_example_features, limit_length=limit_length,
+                                             question_features=question_features)
+            items = ((qid,) for qid in qids)
+        else:
+            assert method in ["pairwise", "pairwise_self_sim"]
+            get_features = functools.partial(self.get_pairwise_example_features, limit_length=limit_length,
+                                             question_features=question_features)
+            items = self.iter_pairwise_triples(qids, num_negative_sample=num_negative_sample,
+                                               self_sim=method == "pairwise_self_sim", seed=seed)
+
+        for item in items:
+            with profiler.stage("serialize", items=1) as timer:
+                record = encoder.encode(get_features(*item))
+                timer.add(nbytes=len(record))
+            yield record
+
+    def write_examples(self, method: str, dest: str, record_filename: str,
+                       num_negative_sample=5,
+                       limit_length=None,
+                       limit_question=None,
+                       num_shards=1,
+                       max_shard_bytes=None,
+                       workers=1,
+                       seed=None) -> dict:
+        qids = self.get_limit_question_ids(limit_question)
+        assert isinstance(workers, int) and workers > 0
+        self.load_encoded_features(limit_length=limit_length)
+        # examples are written out as they are created, in the same order whatever the number of workers
+        writer = ShardedRecordWriter(dest, record_filename, num_shards=num_shards, max_shard_bytes=max_shard_bytes)
+        if workers > 1:
+            records = self.iter_examples_parallel(method, qids,
+                                                  num_negative_sample=num_negative_sample,
+                                                  limit_length=limit_length,
+                                                  workers=workers,
+                                                  seed=seed)
+        else:
+            records = self.iter_examples(method, qids,
+                                         num_negative_sample=num_negative_sample,
+                                         limit_length=limit_length,
+                                         seed=seed)
+        try:
+            for record in records:
+                writer.write(record)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+    def iter_examples_parallel(self, method: str, qids,
+                               num_negative_sample=5,
+                               limit_length=None,
+                               workers=1,
+                               seed=None):
+        # worker processes build the examples of blocks of SAMPLE_BLOCK_SIZE pivots,
+        # blocks are yielded in order so the records are the same as those of iter_examples()
+        self.build_token_ids()
+        tasks = []
+        for start in range(qids.start - qids.start % SAMPLE_BLOCK_SIZE, qids.stop, SAMPLE_BLOCK_SIZE):
+            tasks.append((
+                method,
+                range(max(start, qids.start), min(start + SAMPLE_BLOCK_SIZE, qids.stop)),
+                seed,
+                num_negative_sample,
+                limit_length,
+                profiler.enabled,
+            ))
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(self,)) as pool:
+            for records, state in pool.imap(build_examples, tasks):
+                if state is not None:
+                    profiler.merge(state)
+                yield from records
 
     def convert(self, dest: str,
                 record_filename="leetcode.tfrecord",
@@ -115,49 +530,24 @@ class Converter(object):
                 tag_list_filename="tag_list.txt",
                 word_list_filename="word_list.txt",
                 limit_length=None,
-                limit_question=None, ) -> list:
+                limit_question=None,
+                num_shards=1,
+                max_shard_bytes=None,
+                workers=1,
+                seed=None) -> dict:
         self.write_metadata(dest=dest,
                             question_list_filename=question_list_filename,
                             tag_list_filename=tag_list_filename,
                             word_list_filename=word_list_filename)
 
         # convert to TFRecord
-        example_list = []
-
-        assert limit_question is None or (
-                isinstance(limit_question, int) and 0 <= limit_question <= len(self.question_list))
-        q_list = self.question_list
-        if limit_question is not None:
-            q_list = q_list[:limit_question]
-
-        for q in q_list:
-            topic_tags = q['data']['question']['topicTags']
-            sim_qs = json.loads(q['data']['question']['similarQuestions'])
-            sim_qs_id = []
-            for sq in sim_qs:
-                if sq['titleSlug'] in self.question2id:
-                    sim_qs_id.append(self.question2id[sq['titleSlug']])
-
-            example = tf.train.Example(
-                features=tf.train.Features(feature={
-                    'Text': tf_bytes_feature([
-                        clean_empty_lines(clean_html(
-                            q['data']['question']['content'])).encode('utf-8')]),
-                    'Tokens': tf_int64_feature(
-                        self.tokenize_raw_text_to_id(
-                            q['data']['question']['content'], limit_length=limit_length)),
-                    'Tags': tf_int64_feature([self.tag2id[t['slug']] for t in topic_tags]),
-                    'Similar Questions': tf_int64_feature(sim_qs_id),
-                })
-            )
-            example_list.append(example)
-
-        # write out to disk
-        with tf.python_io.TFRecordWriter(os.path.join(dest, record_filename)) as writer:
-            for e in example_list:
-                writer.write(e.SerializeToString())
-
-        return example_list
+        return self.write_examples("normal", dest, record_filename,
+                                   limit_length=limit_length,
+                                   limit_question=limit_question,
+                                   num_shards=num_shards,
+                                   max_shard_bytes=max_shard_bytes,
+                                   workers=workers,
+                                   seed=seed)
 
     def convert_pairwise(self, dest: str,
                          num_negative_sample=5,
@@ -166,85 +556,25 @@ class Converter(object):
                          tag_list_filename="tag_list.txt",
                          word_list_filename="word_list.txt",
                          limit_length=None,
-                         limit_question=None) -> list:
+                         limit_question=None,
+                         num_shards=1,
+                         max_shard_bytes=None,
+                         workers=1,
+                         seed=None) -> dict:
         self.write_metadata(dest=dest,
                             question_list_filename=question_list_filename,
                             tag_list_filename=tag_list_filename,
                             word_list_filename=word_list_filename)
 
         # convert to TFRecord using pairwise method
-        example_list = []
-        question_set = set(self.question2id.keys())
-
-        assert limit_question is None or (
-                isinstance(limit_question, int) and 0 <= limit_question <= len(self.question_list))
-        q_list = self.question_list
-        if limit_question is not None:
-            q_list = q_list[:limit_question]
-
-        for q in q_list:
-            # only use questions that have similar questions
-            sim_qs = json.loads(q['data']['question']['similarQuestions'])
-            if len(sim_qs) == 0:
-                continue
-
-            sim_q_set = set([sq['titleSlug'] for sq in sim_qs
-                             if sq['titleSlug'] in self.question2id])
-            dis_sim_q_set = question_set - sim_q_set
-            topic_tags = q['data']['question']['topicTags']
-
-            # create pairs
-            for sim_q in sim_q_set:
-                neg_sample_set = random.sample(dis_sim_q_set, num_negative_sample)
-                dis_sim_q_set -= set(neg_sample_set)
-                for dis_q in neg_sample_set:
-                    sim_q_obj = self.question_list[self.question2id[sim_q]]
-                    dis_q_obj = self.question_list[self.question2id[dis_q]]
-                    sim_q_topic_tags = sim_q_obj['data']['question']['topicTags']
-                    dis_q_topic_tags = dis_q_obj['data']['question']['topicTags']
-
-                    # now create one pairwise example
-                    example = tf.train.Example(
-                        features=tf.train.Features(feature={
-                            # pivot question
-                            'Text': tf_bytes_feature([
-                                clean_empty_lines(
-                                    clean_html(
-                                        q['data']['question']['content'])).encode('utf-8')]),
-                            'Tokens': tf_int64_feature(
-                                self.tokenize_raw_text_to_id(
-                                    q['data']['question']['content'], limit_length=limit_length)),
-                            'Tags': tf_int64_feature([self.tag2id[t['slug']] for t in topic_tags]),
-                            # similar question
-                            'Similar Question Text': tf_bytes_feature([
-                                clean_empty_lines(
-                                    clean_html(
-                                        sim_q_obj['data']['question']['content'])).encode('utf-8')]),
-                            'Similar Question Tokens': tf_int64_feature(
-                                self.tokenize_raw_text_to_id(
-                                    sim_q_obj['data']['question']['content'], limit_length=limit_length)),
-                            'Similar Question Tags': tf_int64_feature(
-                                [self.tag2id[t['slug']] for t in sim_q_topic_tags]),
-                            # dissimilar question
-                            'Dissimilar Question Text': tf_bytes_feature([
-                                clean_empty_lines(
-                                    clean_html(
-                                        dis_q_obj['data']['question']['content'])).encode('utf-8')]),
-                            'Dissimilar Question Tokens': tf_int64_feature(
-                                self.tokenize_raw_text_to_id(
-                                    dis_q_obj['data']['question']['content'], limit_length=limit_length)),
-                            'Dissimilar Question Tags': tf_int64_feature(
-                                [self.tag2id[t['slug']] for t in dis_q_topic_tags]),
-                        })
-                    )
-                    example_list.append(example)
-
-        # write out to disk
-        with tf.python_io.TFRecordWriter(os.path.join(dest, record_filename)) as writer:
-            for e in example_list:
-                writer.write(e.SerializeToString())
-
-        return example_list
+        return self.write_examples("pairwise", dest, record_filename,
+                                   num_negative_sample=num_negative_sample,
+                                   limit_length=limit_length,
+                                   limit_question=limit_question,
+                                   num_shards=num_shards,
+                                   max_shard_bytes=max_shard_bytes,
+                                   workers=workers,
+                                   seed=seed)
 
     def convert_pairwise_self_sim(self, dest: str,
                                   num_negative_sample=5,
@@ -253,86 +583,130 @@ class Converter(object):
                                   tag_list_filename="tag_list.txt",
                                   word_list_filename="word_list.txt",
                                   limit_length=None,
-                                  limit_question=None) -> list:
+                                  limit_question=None,
+                                  num_shards=1,
+                                  max_shard_bytes=None,
+                                  workers=1,
+                                  seed=None) -> dict:
         self.write_metadata(dest=dest,
                             question_list_filename=question_list_filename,
                             tag_list_filename=tag_list_filename,
                             word_list_filename=word_list_filename)
 
         # convert to TFRecord using pairwise method with self-sim only
-        example_list = []
-        question_set = set(self.question2id.keys())
-
-        assert limit_question is None or (
-                isinstance(limit_question, int) and 0 <= limit_question <= len(self.question_list))
-        q_list = self.question_list
-        if limit_question is not None:
-            q_list = q_list[:limit_question]
+        return self.write_examples("pairwise_self_sim", dest, record_filename,
+                                   num_negative_sample=num_negative_sample,
+                                   limit_length=limit_length,
+                                   limit_question=limit_question,
+                                   num_shards=num_shards,
+                                   max_shard_bytes=max_shard_bytes,
+                                   workers=workers,
+                                   seed=seed)
+
+    def convert_pairwise_table(self, dest: str,
+                               num_negative_sample=5,
+                               table_filename="leetcode_question_table.tfrecord",
+                               triple_filename="leetcode_pairwise_triples.npy",
+                               question_list_filename="question_list.txt",
+                               tag_list_filename="tag_list.txt",
+                               word_list_filename="word_list.txt",
+                               limit_length=None,
+                               limit_question=None,
+                               num_shards=1,
+                               max_shard_bytes=None,
+                               workers=1,
+                               seed=None,
+                               self_sim=False) -> dict:
+        """
+        Normalized version of convert_pairwise: every question is written once to a table
+        of Id/Text/Tokens/Tags examples, and the (pivot, similar, dissimilar) triples
+        are saved as an (N, 3) int32 .npy array of question ids.
+        """
+        self.write_metadata(dest=dest,
+                            question_list_filename=question_list_filename,
+                            tag_list_filename=tag_list_filename,
+                            word_list_filename=word_list_filename)
 
-        for q in q_list:
-            # similar question is the same as itself
-            sim_q_set = set()
-            sim_q_set.add(q['data']['question']['titleSlug'])
+        # negatives may be any question, so the table holds all of them
+        table = self.write_examples("table", dest, table_filename,
+                                    limit_length=limit_length,
+                                    num_shards=num_shards,
+                                    max_shard_bytes=max_shard_bytes,
+                                    workers=workers)
+
+        # same triples as convert_pairwise with the same seed
+        qids = self.get_limit_question_ids(limit_question)
+        triples = array('i')
+        for triple in self.iter_pairwise_triples(qids,
+                                                 num_negative_sample=num_negative_sample,
+                                                 self_sim=self_sim,
+                                                 seed=seed):
+            triples.extend(triple)
+        triples = np.frombuffer(triples, dtype=np.intc).astype(np.int32, copy=False).reshape(-1, 3)
+        with profiler.stage("write", items=len(triples), nbytes=triples.nbytes):
+            np.save(os.path.join(dest, triple_filename), triples)
+
+        return {
+            'questions': table['examples'],
+            'triples': len(triples),
+            'bytes': table['bytes'] + os.path.getsize(os.path.join(dest, triple_filename)),
+            'files': table['files'] + [triple_filename],
+        }
+
+    def convert_npy(self, dest: str,
+                    prefix="leetcode_",
+                    question_list_filename="question_list.txt",
+                    tag_list_filename="tag_list.txt",
+                    word_list_filename="word_list.txt",
+                    limit_length=None,
+                    limit_question=None) -> dict:
+        """
+        Write the questions as .npy arrays that can be opened with np.load(mmap_mode='r'),
+        row i is question id i:
+            <prefix>tokens.npy          int32 (N, L) token ids padded with <PAD>, L is limit_length
+                                        or the longest question
+            <prefix>lengths.npy         int32 (N,) number of tokens in each row
+            <prefix>tag_indptr.npy      int64 (N + 1,) CSR row pointers of the tags
+            <prefix>tag_indices.npy     int32 tag ids, tags of row i are indices[indptr[i]:indptr[i + 1]]
+            <prefix>sim_indptr.npy      int64 (N + 1,) CSR row pointers of the similar questions
+            <prefix>sim_indices.npy     int32 similar question ids
+        """
+        self.write_metadata(dest=dest,
+                            question_list_filename=question_list_filename,
+                            tag_list_filename=tag_list_filename,
+                            word_list_filename=word_list_filename)
 
-            sim_qs = json.loads(q['data']['question']['similarQuestions'])
-            real_sim_q_set = set([sq['titleSlug'] for sq in sim_qs
-                                  if sq['titleSlug'] in self.question2id])
-
-            dis_sim_q_set = question_set - sim_q_set - real_sim_q_set
-            topic_tags = q['data']['question']['topicTags']
-
-            # create pairs
-            for sim_q in sim_q_set:
-                neg_sample_set = random.sample(dis_sim_q_set, num_negative_sample)
-                dis_sim_q_set -= set(neg_sample_set)
-                for dis_q in neg_sample_set:
-                    sim_q_obj = self.question_list[self.question2id[sim_q]]
-                    dis_q_obj = self.question_list[self.question2id[dis_q]]
-                    sim_q_topic_tags = sim_q_obj['data']['question']['topicTags']
-                    dis_q_topic_tags = dis_q_obj['data']['question']['topicTags']
-
-                    # now create one pairwise example
-                    example = tf.train.Example(
-                        features=tf.train.Features(feature={
-                            # pivot question
-                            'Text': tf_bytes_feature([
-                                clean_empty_lines(
-                                    clean_html(
-                                        q['data']['question']['content'])).encode('utf-8')]),
-                            'Tokens': tf_int64_feature(
-                                self.tokenize_raw_text_to_id(
-                                    q['data']['question']['content'], limit_length=limit_length)),
-                            'Tags': tf_int64_feature([self.tag2id[t['slug']] for t in topic_tags]),
-                            # similar question
-                            'Similar Question Text': tf_bytes_feature([
-                                clean_empty_lines(
-                                    clean_html(
-                                        sim_q_obj['data']['question']['content'])).encode('utf-8')]),
-                            'Similar Question Tokens': tf_int64_feature(
-                                self.tokenize_raw_text_to_id(
-                                    sim_q_obj['data']['question']['content'], limit_length=limit_length)),
-                            'Similar Question Tags': tf_int64_feature(
-                                [self.tag2id[t['slug']] for t in sim_q_topic_tags]),
-                            # dissimilar question
-                            'Dissimilar Question Text': tf_bytes_feature([
-                                clean_empty_lines(
-                                    clean_html(
-                                        dis_q_obj['data']['question']['content'])).encode('utf-8')]),
-                            'Dissimilar Question Tokens': tf_int64_feature(
-                                self.tokenize_raw_text_to_id(
-                                    dis_q_obj['data']['question']['content'], limit_length=limit_length)),
-                            'Dissimilar Question Tags': tf_int64_feature(
-                                [self.tag2id[t['slug']] for t in dis_q_topic_tags]),
-                        })
-                    )
-                    example_list.append(example)
-
-        # write out to disk
-        with tf.python_io.TFRecordWriter(os.path.join(dest, record_filename)) as writer:
-            for e in example_list:
-                writer.write(e.SerializeToString())
-
-        return example_list
+        qids = self.get_limit_question_ids(limit_question)
+        self.build_token_ids()
+        lengths = np.array([len(self.get_token_ids(qid, limit_length=limit_length)) for qid in qids], dtype=np.int32)
+        max_length = limit_length if limit_length is not None else int(lengths.max(initial=0))
+
+        with profiler.stage("write", items=len(qids)):
+            # token matrix is filled row by row straight into the file
+            filenames = [prefix + name + ".npy" for name in
+                         ["tokens", "lengths", "tag_indptr", "tag_indices", "sim_indptr", "sim_indices"]]
+            tokens = np.lib.format.open_memmap(os.path.join(dest, filenames[0]), mode='w+', dtype=np.int32,
+                                               shape=(len(qids), max_length))
+            tokens[:] = self.word2id["<PAD>"]
+            for i, qid in enumerate(qids):
+                tokens[i, :lengths[i]] = self.get_token_ids(qid, limit_length=limit_length)
+            tokens.flush()
+            del tokens
+            np.save(os.path.join(dest, filenames[1]), lengths)
+
+            # tags and similar questions as CSR
+            save_csr(os.path.join(dest, filenames[2]), os.path.join(dest, filenames[3]),
+                     [[self.tag2id[t['slug']] for t in self.question_list[qid]['data']['question']['topicTags']]
+                      for qid in qids])
+            save_csr(os.path.join(dest, filenames[4]), os.path.join(dest, filenames[5]),
+                     [self.get_similar_question_ids(qid) for qid in qids])
+
+        return {
+            'questions': len(qids),
+            'max_length': max_length,
+            'bytes': sum([os.path.getsize(os.path.join(dest, f)) for f in filenames]),
+            'files': filenames,
+        }
 
     def convert_pairwise_txt(self, dest: str,
                              num_negative_sample=5,
@@ -342,7 +716,8 @@ class Converter(object):
                              tag_list_filename="tag_list.txt",
                              word_list_filename="word_list.txt",
                              limit_length=None,
-                             limit_question=None):
+                             limit_question=None,
+                             seed=None) -> dict:
         self.write_metadata(dest=dest,
                             question_list_filename=question_list_filename,
                             tag_list_filename=tag_list_filename,
@@ -351,43 +726,99 @@ class Converter(object):
         # convert to text and relation txt files using pairwise method
         text_file = open(os.path.join(dest, text_filename), 'w')
         relation_file = open(os.path.join(dest, relation_filename), 'w')
-        question_set = set(self.question2id.keys())
-
-        assert limit_question is None or (
-                isinstance(limit_question, int) and 0 <= limit_question <= len(self.question_list))
-        q_list = self.question_list
-        if limit_question is not None:
-            q_list = q_list[:limit_question]
+        qids = self.get_limit_question_ids(limit_question)
+        num_relation = 0
 
         # write out question text
-        for q in q_list:
-            q_txt = clean_empty_lines(clean_html(q['data']['question']['content']))
-            if limit_length is not None and len(q_txt) > limit_length:
-                q_txt = q_txt[:limit_length]
-            text_file.write(q_txt + '\n')
+        with profiler.stage("write", items=len(qids)):
+            for qid in qids:
+                q_txt = self.get_text(qid).decode('utf-8')
+                if limit_length is not None and len(q_txt) > limit_length:
+                    q_txt = q_txt[:limit_length]
+                text_file.write(q_txt + '\n')
 
         # write out relations
-        for q in q_list:
-            # only use questions that have similar questions
-            sim_qs = json.loads(q['data']['question']['similarQuestions'])
-            if len(sim_qs) == 0:
-                continue
-
-            sim_q_set = set([sq['titleSlug'] for sq in sim_qs
-                             if sq['titleSlug'] in self.question2id])
-            dis_sim_q_set = question_set - sim_q_set
-
-            # create pairs
-            for sim_q in sim_q_set:
-                neg_sample_set = random.sample(dis_sim_q_set, num_negative_sample)
-                dis_sim_q_set -= set(neg_sample_set)
-                for dis_q in neg_sample_set:
-                    q_id = self.question2id[q['data']['question']['titleSlug']]
-                    sim_q_id = self.question2id[sim_q]
-                    dis_q_id = self.question2id[dis_q]
-                    relation_file.write("{} {} {}\n".format(q_id, sim_q_id, dis_q_id))
+        for q_id, sim_q_id, dis_q_id in self.iter_pairwise_triples(
+                qids, num_negative_sample=num_negative_sample, seed=seed):
+            relation_file.write("{} {} {}\n".format(q_id, sim_q_id, dis_q_id))
+            num_relation += 1
 
         text_file.close()
         relation_file.close()
 
-        return
+        return {
+            'questions': len(qids),
+            'relations': num_relation,
+        }
+
+
+# state of conversion worker processes, set once by the pool initializer
+worker_converter = None
+
+
+def init_worker(converter: Converter):
+    global worker_converter
+    worker_converter = converter
+
+
+def build_examples(task: tuple) -> tuple:
+    # serialized examples of a block of pivots, stage timings of the block are sent back along with them
+    method, qids, seed, num_negative_sample, limit_length, profile = task
+    if profile:
+        profiler.enable()
+        profiler.reset()
+    if method in ["pairwise", "pairwise_self_sim"]:
+        # encoded question features are kept from block to block
+        worker_converter.encoded.setdefault(limit_length, dict())
+    records = list(worker_converter.iter_examples(method, qids,
+                                                  num_negative_sample=num_negative_sample,
+                                                  limit_length=limit_length,
+                                                  seed=seed))
+    return records, profiler.get_state() if profile else None
+
+
+def save_csr(indptr_filename: str, indices_filename: str, rows):
+    # save variable length int rows as int64 row pointers and int32 indices
+    indptr = array('q', [0])
+    indices = array('i')
+    for row in rows:
+        indices.extend(row)
+        indptr.append(len(indices))
+    np.save(indptr_filename, np.frombuffer(indptr, dtype=np.int64))
+    np.save(indices_filename, np.frombuffer(indices, dtype=np.intc).astype(np.int32))
+
+
+def preprocess_chunk(task: tuple) -> tuple:
+    # run a preprocess function over a chunk of contents in a worker process,
+    # stage timings of the chunk are sent back along with the results
+    func, contents, profile = task
+    if not profile:
+        return [func(c) for c in contents], None
+    profiler.enable()
+    profiler.reset()
+    return [func(c) for c in contents], profiler.get_state()
+
+
+def get_tokens(text: str, limit_length=None) -> list:
+    # lower-cased tokens of a cleaned text, tokenizing stops once limit_length tokens are produced
+    if limit_length is None:
+        return [t.lower() for t in FastTokenizer(text).tokenize()]
+    return [t.lower() for t in itertools.islice(FastTokenizer(text).iter_tokens(), limit_length)]
+
+
+def preprocess_content(content: str, limit_length=None) -> tuple:
+    # clean and tokenize one question, runs in worker processes
+    with profiler.stage("clean", items=1, nbytes=len(content)):
+        text = clean_text(content)
+    with profiler.stage("tokenize", items=1):
+        tokens = get_tokens(text, limit_length=limit_length)
+    return text.encode('utf-8'), tokens
+
+
+def encode_content(content: str, vocab: HashedVocabulary, limit_length=None) -> tuple:
+    # clean, tokenize and hash one question, runs in worker processes
+    with profiler.stage("clean", items=1, nbytes=len(content)):
+        text = clean_text(content)
+    with profiler.stage("tokenize", items=1):
+        token_ids = array('q', vocab.encode(get_tokens(text, limit_length=limit_length)))
+    return text.encode('utf-8'), token_ids
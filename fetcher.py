@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : fetcher.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:05
+# @Desc  : Concurrent question fetcher built on asyncio
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from spider import Spider
+
+
+class AsyncFetcher(object):
+    def __init__(self, spider: Spider, concurrency=8):
+        # request rate is controlled by the spider itself
+        assert isinstance(concurrency, int) and concurrency > 0
+        self.spider = spider
+        self.concurrency = concurrency
+
+    async def fetch_one(self, executor, semaphore, batch, on_result) -> list:
+        slugs = [slug for _, slug in batch]
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            try:
+                # the spider is blocking, so run it in the thread pool
+                texts = await loop.run_in_executor(executor, self.spider.get_question_texts, slugs)
+            except Exception as e:
+                print('failed to fetch {}: {}'.format(', '.join(slugs), e))
+                return slugs
+        failed = []
+        for (question_id, slug), text in zip(batch, texts):
+            if text is None:
+                print('invalid data for {}, skipped'.format(slug))
+                failed.append(slug)
+            else:
+                on_result(question_id, slug, text)
+        return failed
+
+    async def fetch_all_async(self, questions: list, on_result, batch_size=1) -> list:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batches = [questions[i:i + batch_size] for i in range(0, len(questions), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            tasks = [self.fetch_one(executor, semaphore, batch, on_result) for batch in batches]
+            failed_list = await asyncio.gather(*tasks)
+        return [slug for failed in failed_list for slug in failed]
+
+    def fetch_all(self, questions: list, on_result, batch_size=1) -> list:
+        """
+        Fetch question data for a list of (question_id, title_slug) pairs,
+        batch_size questions per request.
+        on_result(question_id, title_slug, text) is called from the event loop
+        thread for every valid question. Returns slugs that failed to fetch.
+        """
+        assert isinstance(batch_size, int) and batch_size > 0
+        return asyncio.run(self.fetch_all_async(questions, on_result, batch_size=batch_size))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : loader.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:13
+# @Desc  : Streaming question loader shared by convert and visualize
+
+import json
+
+from store import RawStore
+from profiler import profiler
+
+
+def iter_questions(store: RawStore, free_only=False, fields=None, index=None):
+    """
+    Lazily parse questions from a raw store.
+    Only one question is held in memory at a time. With free_only, paid questions are skipped.
+    fields is an optional list of question fields to keep, the yielded documents keep the
+    {'data': {'question': ...}} shape either way.
+    index is an optional StatsIndex brought up to date with the store on the way, from the
+    parsed documents: new or changed questions are indexed, once every question is loaded
+    the ones no longer in the store are dropped.
+    """
+    items = store.iter_items()
+    question_ids = set()
+    while True:
+        with profiler.stage("load") as timer:
+            item = next(items, None)
+            if item is not None:
+                timer.add(items=1, nbytes=len(item[1]))
+        if item is None:
+            break
+        question_id, text = item
+        with profiler.stage("parse", items=1):
+            q = json.loads(text)
+        question = q['data']['question']
+        if index is not None:
+            index.put(question_id, text, question=question)
+            question_ids.add(question_id)
+        if free_only and question['isPaidOnly']:
+            continue
+        if fields is not None:
+            q = {'data': {'question': {k: question[k] for k in fields}}}
+        yield q
+    if index is not None:
+        for question_id in set(index.entries.keys()) - question_ids:
+            index.remove(question_id)
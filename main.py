@@ -5,118 +5,304 @@
 # @Date  : 19-3-17 下午7:41
 # @Desc  : Main cli
 
-import time
 import os
 import argparse
 import json
 
-from spider import Spider
-from converter import Converter
+from spider import Spider, AdaptiveRateController, RetryPolicy, InvalidResponseError
+from fetcher import AsyncFetcher
+from manifest import FetchManifest, STATUS_OK
+from sync import diff_question_lists
+from store import RawStore, DirStore, STORE_TYPES, open_store, migrate_store
+from loader import iter_questions
+from stats_index import StatsIndex, STATS_INDEX_FILENAME
+from vocab import VOCAB_TYPES
+from profiler import profiler
 from util import *
 
 SPIDER_SLEEP_PERIOD = 0.5
+MIN_SPIDER_RATE = 0.2
+MAX_SPIDER_RATE = 10.0
 RESULT_DIR = "result"
+MANIFEST_FILENAME = "_manifest.jsonl"
 TF_RECORD_DIR = "tf_data"
 PLOT_DIR = "plots"
 
 
+def create_spider(args) -> Spider:
+    initial_rate = 1.0 / SPIDER_SLEEP_PERIOD
+    return Spider(
+        base_url=args.base_url,
+        pool_size=args.concurrency,
+        rate_controller=AdaptiveRateController(
+            initial_rate=min(initial_rate, args.rate),
+            min_rate=min(MIN_SPIDER_RATE, args.rate),
+            max_rate=args.rate,
+        ),
+        retry_policy=RetryPolicy(max_retries=args.max_retries),
+    )
+
+
+def fetch_questions(args, spider: Spider, questions: list, store: RawStore, manifest: FetchManifest,
+                    index: StatsIndex):
+    # fetch (question_id, title_slug) pairs into the store, record them in the manifest and the stats index
+    cnt = 0
+    tot = len(questions)
+
+    timer = profiler.stage("question fetch")
+
+    def save_question(question_id, slug, text):
+        nonlocal cnt
+        cnt += 1
+        timer.add(items=1, nbytes=len(text))
+        print('progress {}/{}, fetched {}'.format(str(cnt), str(tot), slug))
+        store.put(question_id, slug, text)
+        manifest.record_ok(slug, question_id, text)
+        index.put(question_id, text)
+
+    # concurrency 1 fetches sequentially, pacing is done by the spider's rate controller
+    fetcher = AsyncFetcher(spider, concurrency=args.concurrency)
+    with timer:
+        failed = fetcher.fetch_all(questions, on_result=save_question, batch_size=args.batch_size)
+    if len(failed) > 0:
+        slug2id = {slug: qid for qid, slug in questions}
+        for slug in failed:
+            manifest.record_failed(slug, slug2id[slug])
+        print('{} questions failed to fetch: {}'.format(len(failed), ', '.join(failed)))
+        print('run again with --resume to retry them')
+    manifest.compact()
+    index.save()
+
+    stats = spider.get_connection_stats()
+    print('{} requests sent, {} connections opened, {} reused'.format(
+        stats['requests'], stats['opened'], stats['reused']))
+
+
 def fetch_data(args):
     # create dir for data storage
     cur_path = os.path.dirname(os.path.abspath(__file__))
     create_dir(os.path.join(cur_path, RESULT_DIR))
 
-    spider = Spider()
+    spider = create_spider(args)
 
     # fetch question list and save to a file
-    question_list = spider.get_question_list()
+    with profiler.stage("list fetch", items=1):
+        response = spider.get_question_list()
+    try:
+        question_list = spider.parse_list_response(response)
+    except InvalidResponseError as e:
+        # keep the question list of the last run, it is the baseline of sync
+        spider.close()
+        raise SystemExit('failed to fetch the question list: {}'.format(e))
     question_list_f = open(os.path.join(cur_path, "question_list.json"), 'w')
-    question_list_f.write(question_list.text)
+    question_list_f.write(response.text)
     question_list_f.close()
 
-    question_list = question_list.json()
-    # print(question_list)
     # print(len(question_list['stat_status_pairs']))
 
     # fetch all question data
     question_list = question_list['stat_status_pairs']
     result_path = os.path.join(cur_path, RESULT_DIR)
-    cnt = 0
-    tot = len(question_list)
-    for q in question_list:
-        cnt += 1
-        print('progress {}/{}'.format(str(cnt), str(tot)))
-
-        slug = q['stat']['question__title_slug']
-        print('fetching {} ...'.format(slug))
-
-        d = spider.get_question_data(slug)
-        qf = open(os.path.join(result_path, str(q['stat']['question_id']) + '.json'), 'w')
-        qf.write(d.text)
-        qf.close()
-
-        time.sleep(SPIDER_SLEEP_PERIOD)
+    questions = [(q['stat']['question_id'], q['stat']['question__title_slug']) for q in question_list]
+    store = open_store(args.store, result_path)
+    manifest = FetchManifest(os.path.join(result_path, MANIFEST_FILENAME))
+    if args.resume:
+        # skip questions fetched successfully by a previous run
+        questions = [(qid, slug) for qid, slug in questions
+                     if not (manifest.is_ok(slug) and store.has(qid))]
+        print('resuming, {} of {} questions left to fetch'.format(len(questions), len(question_list)))
+
+    index = StatsIndex(os.path.join(result_path, STATS_INDEX_FILENAME))
+    fetch_questions(args, spider, questions, store, manifest, index)
+    manifest.close()
+    store.close()
+    spider.close()
+
+
+def sync_data(args):
+    cur_path = os.path.dirname(os.path.abspath(__file__))
+    result_path = os.path.join(cur_path, RESULT_DIR)
+    create_dir(result_path)
+    question_list_path = os.path.join(cur_path, "question_list.json")
+
+    # question list saved by the previous fetch/sync
+    old_question_list = []
+    if os.path.isfile(question_list_path):
+        with open(question_list_path, 'r') as f:
+            old_question_list = json.load(f)['stat_status_pairs']
+
+    spider = create_spider(args)
+    with profiler.stage("list fetch", items=1):
+        response = spider.get_question_list()
+    try:
+        new_question_list = spider.parse_list_response(response)['stat_status_pairs']
+    except InvalidResponseError as e:
+        spider.close()
+        raise SystemExit('failed to fetch the question list: {}'.format(e))
+    new_question_list_text = response.text
+
+    # questions already in the local store
+    store = open_store(args.store, result_path)
+    manifest = FetchManifest(os.path.join(result_path, MANIFEST_FILENAME))
+    local_slugs = set()
+    for q in old_question_list + new_question_list:
+        qid, slug = q['stat']['question_id'], q['stat']['question__title_slug']
+        if store.has(qid) and (manifest.is_ok(slug) or slug not in manifest.entries):
+            local_slugs.add(slug)
+
+    diff = diff_question_lists(old_question_list, new_question_list, local_slugs)
+    print("added: {}, changed: {}, unchanged: {}, removed: {}".format(
+        len(diff['added']), len(diff['changed']), len(diff['unchanged']), len(diff['removed'])))
+    for key in ['added', 'changed', 'removed']:
+        for qid, slug in diff[key]:
+            print("  {} {}".format(key, slug))
+
+    index = StatsIndex(os.path.join(result_path, STATS_INDEX_FILENAME))
+    fetch_questions(args, spider, diff['added'] + diff['changed'], store, manifest, index)
+    manifest.close()
+    store.close()
+    spider.close()
+
+    # the new list becomes the baseline of the next sync
+    with open(question_list_path, 'w') as f:
+        f.write(new_question_list_text)
+
+
+def open_stats_index(store: RawStore, result_path: str) -> StatsIndex:
+    # load the stats index of result/, questions missing from it or fetched since are indexed again
+    index = StatsIndex(os.path.join(result_path, STATS_INDEX_FILENAME))
+    sha1s = None
+    manifest_path = os.path.join(result_path, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        manifest = FetchManifest(manifest_path)
+        sha1s = {e['question_id']: e['sha1'] for e in manifest.entries.values() if e['status'] == STATUS_OK}
+        manifest.close()
+    cnt = index.refresh(store, sha1s)
+    if cnt > 0:
+        print("{} questions (re)indexed".format(cnt))
+        index.save()
+    return index
 
 
 def convert_data(args):
+    # numpy and the converter are only loaded by the actions that need them
+    from converter import Converter
+    from convert_cache import ConvertCache, CONVERT_CACHE_FILENAME
+
     # create dir
     cur_path = os.path.dirname(os.path.abspath(__file__))
     result_path = os.path.join(cur_path, RESULT_DIR)
     tf_data_path = os.path.join(cur_path, TF_RECORD_DIR)
     create_dir(tf_data_path)
 
-    # read in result
-    print("loading result files from disk")
-    result_files = [f for f in os.listdir(result_path)
-                    if os.path.isfile(os.path.join(result_path, f))]
-    print("{} files detected".format(len(result_files)))
-    result_list = []
-    for f in result_files:
-        ff = open(os.path.join(result_path, f), 'r')
-        result_list.append(ff.read())
-        ff.close()
-    print("result files loaded successfully")
-
-    # parse result files
-    print("parsing result files (json format)")
-    question_list = [json.loads(s) for s in result_list]
-
-    # we use free questions only
-    valid_question_list = [q for q in question_list if not q['data']['question']['isPaidOnly']]
+    # load and parse result, we use free questions only
+    print("loading questions from {} store".format(args.store))
+    store = open_store(args.store, result_path)
+    print("{} questions detected".format(len(store)))
+    # the stats index is refreshed from the documents parsed here, not from the raw json again
+    index = StatsIndex(os.path.join(result_path, STATS_INDEX_FILENAME))
+    valid_question_list = list(iter_questions(store, free_only=True, fields=Converter.question_fields,
+                                              index=index))
+    store.close()
     print("number of valid questions is {}".format(len(valid_question_list)))
 
     # convert to TFRecords and save to files
     converter = Converter(question_list=valid_question_list)
+    cache = None
+    if args.cache:
+        # unchanged questions are not cleaned, tokenized and encoded again
+        cache = ConvertCache(os.path.join(result_path, CONVERT_CACHE_FILENAME))
+        converter.use_cache(cache)
+    if args.vocab_file is not None:
+        with profiler.stage("vocab"):
+            converter.load_vocab(args.vocab_file)
+        print("reusing vocabulary of size {} from {}".format(len(converter.vocab), args.vocab_file))
+    elif args.vocab == "hashed":
+        # no vocabulary pass, words are hashed while preprocessing
+        converter.use_hashed_vocab(args.buckets)
+        print("hashing words into {} buckets".format(args.buckets))
+    # a hashed or reused vocabulary needs no token counts, only the first limit_length tokens are produced
+    converter.preprocess(workers=args.workers, limit_length=args.limit_length)
+    if args.vocab_file is None and args.vocab == "dict":
+        with profiler.stage("vocab", items=len(valid_question_list)):
+            converter.create_word2id(min_count=args.min_count, max_size=args.max_vocab)
+        print("vocabulary size is {} ({} distinct tokens)".format(len(converter.word2id), len(converter.words)))
+    index.set_token_counts(converter.get_token_counts())
+    index.save()
+    max_shard_bytes = None if args.max_shard_mb is None else int(args.max_shard_mb * 1024 * 1024)
     if args.method == "normal":
-        example_list = converter.convert(
+        summary = converter.convert(
             dest=TF_RECORD_DIR,
             limit_length=args.limit_length,
             limit_question=args.limit_question,
+            num_shards=args.num_shards,
+            max_shard_bytes=max_shard_bytes,
+            workers=args.workers,
+            seed=args.seed,
         )
-        print(example_list[0])
     elif args.method == "pairwise":
-        example_list = converter.convert_pairwise(
+        summary = converter.convert_pairwise(
             dest=TF_RECORD_DIR,
             limit_length=args.limit_length,
             limit_question=args.limit_question,
+            num_shards=args.num_shards,
+            max_shard_bytes=max_shard_bytes,
+            workers=args.workers,
+            seed=args.seed,
         )
-        print(example_list[0])
-        print('Total: {}'.format(len(example_list)))
     elif args.method == "pairwise_self_sim":
-        example_list = converter.convert_pairwise_self_sim(
+        summary = converter.convert_pairwise_self_sim(
+            dest=TF_RECORD_DIR,
+            limit_length=args.limit_length,
+            limit_question=args.limit_question,
+            num_shards=args.num_shards,
+            max_shard_bytes=max_shard_bytes,
+            workers=args.workers,
+            seed=args.seed,
+        )
+    elif args.method in ["pairwise_table", "pairwise_self_sim_table"]:
+        summary = converter.convert_pairwise_table(
+            dest=TF_RECORD_DIR,
+            limit_length=args.limit_length,
+            limit_question=args.limit_question,
+            num_shards=args.num_shards,
+            max_shard_bytes=max_shard_bytes,
+            workers=args.workers,
+            seed=args.seed,
+            self_sim=args.method == "pairwise_self_sim_table",
+        )
+    elif args.method == "npy":
+        summary = converter.convert_npy(
             dest=TF_RECORD_DIR,
             limit_length=args.limit_length,
             limit_question=args.limit_question,
         )
-        print(example_list[0])
-        print('Total: {}'.format(len(example_list)))
     elif args.method == "pairwise_txt":
-        converter.convert_pairwise_txt(
+        summary = converter.convert_pairwise_txt(
             dest=TF_RECORD_DIR,
             limit_length=args.limit_length,
             limit_question=args.limit_question,
+            seed=args.seed,
         )
-        # print(example_list[0])
-        # print('Total: {}'.format(len(example_list)))
+    print('Total: {}'.format(summary))
+    if cache is not None:
+        dropped = cache.prune(converter.text_keys, max_bytes=int(args.cache_mb * 1024 * 1024))
+        print("conversion cache: {} hits, {} misses, {} entries dropped".format(cache.hits, cache.misses, dropped))
+        cache.close()
+
+
+def migrate_store_data(args):
+    # copy the legacy result/ directory into a consolidated store
+    cur_path = os.path.dirname(os.path.abspath(__file__))
+    result_path = os.path.join(cur_path, RESULT_DIR)
+    if args.store == "dir":
+        print("--store must name a consolidated store to migrate result/ into, e.g. --store sqlite")
+        return
+    src = DirStore(result_path)
+    dest = open_store(args.store, result_path)
+    cnt = migrate_store(src, dest)
+    dest.close()
+    print("{} questions migrated to {} store".format(cnt, args.store))
 
 
 def visualize_data(args):
@@ -126,28 +312,34 @@ def visualize_data(args):
     plot_path = os.path.join(cur_path, PLOT_DIR)
     create_dir(plot_path)
 
-    # read in result
-    print("loading result files from disk")
-    result_files = [f for f in os.listdir(result_path)
-                    if os.path.isfile(os.path.join(result_path, f))]
-    print("{} files detected".format(len(result_files)))
-    result_list = []
-    for f in result_files:
-        ff = open(os.path.join(result_path, f), 'r')
-        result_list.append(ff.read())
-        ff.close()
-    print("result files loaded successfully")
-
-    # parse result files
-    print("parsing result files (json format)")
-    question_list = [json.loads(s) for s in result_list]
+    print("loading stats index of {} store".format(args.store))
+    store = open_store(args.store, result_path)
+    index = open_stats_index(store, result_path)
+    store.close()
+    visualize_index(index, plot_path)
+
+
+def visualize_store(store: RawStore, plot_path: str):
+    # index the whole store in memory, e.g. a store without a saved stats index
+    index = StatsIndex()
+    index.refresh(store)
+    visualize_index(index, plot_path)
+
+
+def visualize_index(index: StatsIndex, plot_path: str):
+    # matplotlib is only loaded by the actions that need it
+    from plot import plot_pie, plot_bar, plot_loss
+
+    summary = index.summary()
+    num_question = summary['questions']
+    num_free_question = summary['free_questions']
+    num_sim_question = summary['questions_with_similar']  # free questions having at least one sim question
 
     print("=========================================")
-    print("Total number of questions: {}".format(len(question_list)))
-    free_question_list = [q for q in question_list if not q['data']['question']['isPaidOnly']]
-    print("Number of free questions: {}".format(len(free_question_list)))
-    n1 = len(free_question_list)
-    n2 = len(question_list) - len(free_question_list)
+    print("Total number of questions: {}".format(num_question))
+    print("Number of free questions: {}".format(num_free_question))
+    n1 = num_free_question
+    n2 = num_question - num_free_question
     p = plot_pie(
         labels=[u'可用练习题 ({})'.format(n1), u'不可用练习题 ({})'.format(n2)],
         sizes=[n1, n2],
@@ -157,16 +349,10 @@ def visualize_data(args):
     p.savefig(os.path.join(plot_path, '1.png'))
 
     print("=========================================")
-    for i in range(len(free_question_list)):
-        free_question_list[i]['data']['question']['similarQuestions'] = json.loads(
-            free_question_list[i]['data']['question']['similarQuestions']
-        )
-    valid_question_list = [q for q in free_question_list if
-                           len(q['data']['question']['similarQuestions']) > 0]
     print("Number of valid questions (questions having at least one sim question): {}"
-          .format(len(valid_question_list)))
-    n1 = len(valid_question_list)
-    n2 = len(free_question_list) - len(valid_question_list)
+          .format(num_sim_question))
+    n1 = num_sim_question
+    n2 = num_free_question - num_sim_question
     p = plot_pie(
         labels=[u'有标注练习题 ({})'.format(n1), u'无标注练习题 ({})'.format(n2)],
         sizes=[n1, n2],
@@ -176,21 +362,13 @@ def visualize_data(args):
     p.savefig(os.path.join(plot_path, '2.png'))
 
     print("Number of similar questions distribution: ")
-    sim_q_count_list = [len(l['data']['question']['similarQuestions']) for l in valid_question_list]
-    sim_q_count_dict = {}
+    sim_q_count_dict = summary['similar_count_distribution']
     sim_q_bar_list = []
-    for i in range(5):
-        sim_q_count_dict[i + 1] = 0
-    for c in sim_q_count_list:
-        if c < 5:
-            sim_q_count_dict[c] += 1
-        else:
-            sim_q_count_dict[5] += 1
     for i in range(4):
-        print("  {} --- {}".format(i + 1, sim_q_count_dict[i + 1]))
-        sim_q_bar_list.append(sim_q_count_dict[i + 1])
-    print(">=5 --- {}".format(sim_q_count_dict[5]))
-    sim_q_bar_list.append(sim_q_count_dict[5])
+        print("  {} --- {}".format(i + 1, sim_q_count_dict[str(i + 1)]))
+        sim_q_bar_list.append(sim_q_count_dict[str(i + 1)])
+    print(">=5 --- {}".format(sim_q_count_dict['>=5']))
+    sim_q_bar_list.append(sim_q_count_dict['>=5'])
     p = plot_bar(
         labels=[u'1', u'2', u'3', u'4', u'至少 5 道'],
         data=sim_q_bar_list,
@@ -204,22 +382,54 @@ def visualize_data(args):
     plot_loss(steps=300, max_val=16, bend=0.025).savefig(os.path.join(plot_path, '5.png'))
 
 
+def stats_data(args):
+    # summary report from the stats index, the raw json is only read for questions not indexed yet
+    cur_path = os.path.dirname(os.path.abspath(__file__))
+    result_path = os.path.join(cur_path, RESULT_DIR)
+    store = open_store(args.store, result_path)
+    index = open_stats_index(store, result_path)
+    store.close()
+    summary = index.summary()
+
+    print("=========================================")
+    print("Total number of questions: {}".format(summary['questions']))
+    print("Number of free questions: {}".format(summary['free_questions']))
+    print("Number of paid questions: {}".format(summary['paid_questions']))
+    print("Number of free questions having at least one sim question: {}".format(
+        summary['questions_with_similar']))
+    print("Number of similar questions distribution: ")
+    for k, c in summary['similar_count_distribution'].items():
+        print("  {} --- {}".format(k, c))
+    if summary['content_length']['mean'] is not None:
+        print("Content length of free questions: mean {:.1f}, max {}".format(
+            summary['content_length']['mean'], summary['content_length']['max']))
+    if summary['token_count']['mean'] is not None:
+        print("Token count of {} converted questions: mean {:.1f}, max {}".format(
+            summary['token_count']['questions'], summary['token_count']['mean'], summary['token_count']['max']))
+    print("Number of free questions per tag: ")
+    for tag, c in summary['tags'].items():
+        print("  {} --- {}".format(tag, c))
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'action',
-        help="Set action for the spider. Supported actions: fetch_data, convert_data, visualize_data",
+        help="Set action for the spider. Supported actions:" +
+             " fetch_data, sync, convert_data, visualize_data, stats, migrate_store",
         type=str,
-        choices=["fetch_data", "convert_data", "visualize_data"],
+        choices=["fetch_data", "sync", "convert_data", "visualize_data", "stats", "migrate_store"],
     )
     parser.add_argument(
         "--method",
         "-m",
         help="Set method for converting data. Supported methods:" +
-             " normal(default), pairwise, pairwise_self_sim, pairwise_txt",
+             " normal(default), pairwise, pairwise_self_sim, pairwise_table, pairwise_self_sim_table,"
+             " pairwise_txt, npy",
         type=str,
         default="normal",
-        choices=["normal", "pairwise", "pairwise_self_sim", "pairwise_txt"],
+        choices=["normal", "pairwise", "pairwise_self_sim", "pairwise_table", "pairwise_self_sim_table",
+                 "pairwise_txt", "npy"],
     )
     parser.add_argument(
         "--limit_length",
@@ -235,18 +445,170 @@ def main():
         type=int,
         default=None,
     )
+    # a fixed number of shards or a size limit per shard, not both
+    shard_group = parser.add_mutually_exclusive_group()
+    shard_group.add_argument(
+        "--num_shards",
+        help="Set number of TFRecord shards written by convert_data. Default: 1 (single file)",
+        type=int,
+        default=1,
+    )
+    shard_group.add_argument(
+        "--max_shard_mb",
+        help="Start a new TFRecord shard whenever the current one reaches this size in MB." +
+             " Default: unlimited",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        help="Set number of worker processes for convert_data. Default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--seed",
+        help="Set random seed of negative sampling, makes convert_data output deterministic. Default: none",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--vocab",
+        help="Set vocabulary type. Supported types: dict(default), hashed",
+        type=str,
+        default="dict",
+        choices=VOCAB_TYPES,
+    )
+    parser.add_argument(
+        "--buckets",
+        help="Set number of hash buckets for --vocab hashed, ids 0 and 1 stay reserved. Default: 65536",
+        type=int,
+        default=65536,
+    )
+    parser.add_argument(
+        "--min_count",
+        help="Set min number of occurrences for a word to get its own id, rarer words map to <UNK>. Default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--max_vocab",
+        help="Set max vocabulary size including <PAD> and <UNK>, the most frequent words are kept."
+             " Default: unlimited",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--vocab_file",
+        help="Set an existing word_list.txt (or vocab_hash.json) to reuse instead of building a new vocabulary."
+             " Default: None",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--cache",
+        help="Keep cleaned, tokenized and encoded questions in result/_convert_cache.sqlite3 and only convert"
+             " changed questions again",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache_mb",
+        help="Set max size of the --cache data in MB, least recently used entries are dropped. Default: 512",
+        type=float,
+        default=512,
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        help="Set max number of in-flight requests when fetching data. Default: 1 (sequential)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--rate",
+        "-r",
+        help="Set max requests per second when fetching data, the actual rate adapts to" +
+             " server responses below it. Default: {}".format(MAX_SPIDER_RATE),
+        type=float,
+        default=MAX_SPIDER_RATE,
+    )
+    parser.add_argument(
+        "--max_retries",
+        help="Set max retries of a request on 429/5xx or network errors. Default: 5",
+        type=int,
+        default=5,
+    )
+    parser.add_argument(
+        "--batch_size",
+        "-b",
+        help="Set number of questions fetched per GraphQL request. Default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--resume",
+        help="Only fetch questions that are missing or failed in the fetch manifest of a previous run",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--store",
+        "-s",
+        help="Set backend of the raw question store in result/. Supported stores:" +
+             " dir(default, one json file per question), sqlite(single file)",
+        type=str,
+        default="dir",
+        choices=STORE_TYPES,
+    )
+    parser.add_argument(
+        "--base_url",
+        help="Set base url of LeetCode, e.g. a local stub server. Default: https://leetcode.com/",
+        type=str,
+        default="https://leetcode.com/",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Record wall/cpu time, items and throughput of every stage and http latencies,"
+             " print a summary and write it to --profile_output",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile_output",
+        help="Set json file for --profile metrics. Default: profile_<action>.json",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--cprofile_stage",
+        help="Set a stage to run under cProfile with --profile, e.g. tokenize or serialize."
+             " Stages run in worker processes are not covered. Default: None",
+        type=str,
+        default=None,
+    )
     args = parser.parse_args()
 
     action_dict = {
         'fetch_data': fetch_data,
+        'sync': sync_data,
         'convert_data': convert_data,
         'visualize_data': visualize_data,
+        'stats': stats_data,
+        'migrate_store': migrate_store_data,
     }
 
-    if args.action in action_dict:
-        action_dict[args.action](args)
-    else:
+    if args.action not in action_dict:
         print("Invalid action \"{}\" specified".format(args.action))
+        return
+    if args.profile:
+        profiler.enable(cprofile_stage=args.cprofile_stage)
+    with profiler.stage("total"):
+        action_dict[args.action](args)
+    if args.profile:
+        profiler.print_summary()
+        profiler.print_cprofile()
+        profile_output = args.profile_output or "profile_{}.json".format(args.action)
+        profiler.dump(profile_output)
+        print("metrics written to {}".format(profile_output))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : manifest.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:11
+# @Desc  : Fetch manifest for resumable crawls
+
+import os
+import json
+import time
+import hashlib
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+class FetchManifest(object):
+    """
+    Append-only jsonl log of fetch results, one line per fetch attempt.
+    The latest line of a slug wins, so a crash can lose at most the line being written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = dict()
+        self.load()
+        self.f = open(self.path, 'a')
+
+    def load(self):
+        self.entries.clear()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn line from an interrupted write
+                    continue
+                self.entries[entry['slug']] = entry
+
+    def append(self, entry: dict):
+        self.entries[entry['slug']] = entry
+        self.f.write(json.dumps(entry) + '\n')
+        self.f.flush()
+
+    def record_ok(self, slug: str, question_id, text: str):
+        data = text.encode('utf-8')
+        self.append({
+            'slug': slug,
+            'question_id': question_id,
+            'status': STATUS_OK,
+            'size': len(data),
+            'sha1': hashlib.sha1(data).hexdigest(),
+            'fetched_at': time.time(),
+        })
+
+    def record_failed(self, slug: str, question_id):
+        self.append({
+            'slug': slug,
+            'question_id': question_id,
+            'status': STATUS_FAILED,
+            'size': 0,
+            'sha1': None,
+            'fetched_at': time.time(),
+        })
+
+    def is_ok(self, slug: str) -> bool:
+        entry = self.entries.get(slug)
+        return entry is not None and entry['status'] == STATUS_OK
+
+    def compact(self):
+        # rewrite with the latest entry of each slug only
+        self.f.close()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, self.path)
+        self.f = open(self.path, 'a')
+
+    def close(self):
+        self.f.close()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : profiler.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:32
+# @Desc  : Per-stage wall/cpu time, throughput and http latency metrics for --profile
+
+import json
+import time
+import bisect
+import threading
+
+# upper bounds of the http latency histogram buckets in seconds, the last bucket is unbounded
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class StageTimer(object):
+    """Times one run of a stage, items and bytes processed can be added while it runs."""
+
+    def __init__(self, profiler: 'Profiler', name: str, items=0, nbytes=0):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+        self.nbytes = nbytes
+        self.cprofile = None
+
+    def add(self, items=0, nbytes=0):
+        self.items += items
+        self.nbytes += nbytes
+
+    def __enter__(self):
+        if self.name == self.profiler.cprofile_stage:
+            self.cprofile = self.profiler.get_cprofile()
+            self.cprofile.enable()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        self.profiler.add(self.name, wall, cpu, items=self.items, nbytes=self.nbytes)
+
+
+class NullTimer(object):
+    """Stands in for StageTimer while profiling is disabled."""
+
+    def add(self, items=0, nbytes=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Profiler(object):
+    """
+    Accumulates, per stage name: number of runs, wall time, cpu time of this process,
+    items and bytes. Stages may nest, e.g. parse inside load. Disabled by default, then
+    stage() costs next to nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cprofile_stage = None
+        self.cprofile = None
+        self.lock = threading.Lock()
+        self.stages = dict()  # name -> [calls, wall, cpu, items, bytes]
+        self.latencies = dict()  # name -> [bucket counts..., sum, max]
+
+    def enable(self, cprofile_stage=None):
+        self.enabled = True
+        self.cprofile_stage = cprofile_stage
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.latencies.clear()
+
+    def get_cprofile(self):
+        if self.cprofile is None:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+        return self.cprofile
+
+    def stage(self, name: str, items=0, nbytes=0):
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, name, items=items, nbytes=nbytes)
+
+    def add(self, name: str, wall: float, cpu: float, items=0, nbytes=0, calls=1):
+        with self.lock:
+            s = self.stages.get(name)
+            if s is None:
+                s = [0, 0.0, 0.0, 0, 0]
+                self.stages[name] = s
+            s[0] += calls
+            s[1] += wall
+            s[2] += cpu
+            s[3] += items
+            s[4] += nbytes
+
+    def record_latency(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            h = self.latencies.get(name)
+            if h is None:
+                h = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0.0]
+                self.latencies[name] = h
+            h[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            h[-2] += seconds
+            h[-1] = max(h[-1], seconds)
+
+    def get_state(self) -> dict:
+        # raw state, to be merged into the profiler of the parent process
+        with self.lock:
+            return {'stages': {k: list(v) for k, v in self.stages.items()},
+                    'latencies': {k: list(v) for k, v in self.latencies.items()}}
+
+    def merge(self, state: dict):
+        for name, (calls, wall, cpu, items, nbytes) in state['stages'].items():
+            self.add(name, wall, cpu, items=items, nbytes=nbytes, calls=calls)
+        with self.lock:
+            for name, h in state['latencies'].items():
+                if name not in self.latencies:
+                    self.latencies[name] = list(h)
+                    continue
+                mine = self.latencies[name]
+                for i in range(len(h) - 1):
+                    mine[i] += h[i]
+                mine[-1] = max(mine[-1], h[-1])
+
+    def summary(self) -> dict:
+        stages = dict()
+        for name, (calls, wall, cpu, items, nbytes) in self.stages.items():
+            stages[name] = {
+                'calls': calls,
+                'wall_seconds': wall,
+                'cpu_seconds': cpu,
+                'items': items,
+                'bytes': nbytes,
+                'items_per_second': items / wall if wall > 0 else None,
+                'bytes_per_second': nbytes / wall if wall > 0 else None,
+            }
+        latencies = dict()
+        for name, h in self.latencies.items():
+            count = sum(h[:-2])
+            latencies[name] = {
+                'count': count,
+                'mean_seconds': h[-2] / count if count > 0 else None,
+                'max_seconds': h[-1],
+                'buckets': [{'le': le, 'count': c} for le, c in zip(LATENCY_BUCKETS + ['inf'], h[:-2])],
+            }
+        return {'stages': stages, 'http_latency': latencies}
+
+    def print_summary(self):
+        summary = self.summary()
+        print("=========================================")
+        print("{:<18}{:>8}{:>10}{:>10}{:>10}{:>12}{:>10}".format(
+            "stage", "calls", "wall(s)", "cpu(s)", "items", "items/s", "MB/s"))
+        for name, s in summary['stages'].items():
+            print("{:<18}{:>8}{:>10.3f}{:>10.3f}{:>10}{:>12}{:>10}".format(
+                name, s['calls'], s['wall_seconds'], s['cpu_seconds'], s['items'],
+                "-" if not s['items_per_second'] else "{:.1f}".format(s['items_per_second']),
+                "-" if not s['bytes_per_second'] else "{:.2f}".format(s['bytes_per_second'] / 1024 / 1024)))
+        for name, h in summary['http_latency'].items():
+            print("{}: {} requests, mean {:.1f} ms, max {:.1f} ms".format(
+                name, h['count'], (h['mean_seconds'] or 0) * 1000, h['max_seconds'] * 1000))
+            for b in h['buckets']:
+                if b['count'] > 0:
+                    print("  <= {:>6} s {:>8}".format(b['le'], b['count']))
+
+    def dump(self, filename: str):
+        with open(filename, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        if self.cprofile is not None:
+            # binary pstats next to the metrics, e.g. snakeviz profile.json.tokenize.prof
+            self.cprofile.dump_stats("{}.{}.prof".format(filename, self.cprofile_stage.replace(" ", "_")))
+
+    def print_cprofile(self, limit=20):
+        if self.cprofile is None:
+            return
+        import pstats
+        print("cProfile of stage {}:".format(self.cprofile_stage))
+        pstats.Stats(self.cprofile).sort_stats("cumulative").print_stats(limit)
+
+
+# the profiler of this process, enabled by main.py --profile
+profiler = Profiler()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : record_writer.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:15
+# @Desc  : Streaming, sharded TFRecord writer
+
+import os
+import glob
+
+from tfrecord import TFRecordWriter
+from profiler import profiler
+
+# every TFRecord has a uint64 length, two uint32 crcs and the data itself
+RECORD_OVERHEAD = 16
+
+
+class ShardedRecordWriter(object):
+    """
+    Write serialized examples as they are produced.
+    With num_shards > 1 records are spread round-robin over
+    <name>-00000-of-0000N<ext> ... files, with max_shard_bytes a new shard is started
+    whenever the current one reaches the size limit. Otherwise a single file is written.
+    Files written for the same record_filename by an earlier run are removed first.
+    """
+
+    def __init__(self, dest: str, record_filename: str, num_shards=1, max_shard_bytes=None):
+        assert isinstance(num_shards, int) and num_shards > 0
+        assert max_shard_bytes is None or max_shard_bytes > 0
+        assert num_shards == 1 or max_shard_bytes is None, "use either num_shards or max_shard_bytes"
+        self.dest = dest
+        self.record_filename = record_filename
+        self.num_shards = num_shards
+        self.max_shard_bytes = max_shard_bytes
+        self.name, self.ext = os.path.splitext(record_filename)
+
+        self.num_records = 0
+        self.num_bytes = 0
+        self.filenames = []
+        self.writers = []
+        self.shard_bytes = 0
+        self.remove_old_files()
+        if max_shard_bytes is not None:
+            # total number of shards is unknown until close()
+            self.open_shard(os.path.join(dest, '{}-{:05d}{}.tmp'.format(self.name, 0, self.ext)))
+        elif num_shards == 1:
+            self.open_shard(os.path.join(dest, record_filename))
+        else:
+            for i in range(num_shards):
+                self.open_shard(os.path.join(
+                    dest, '{}-{:05d}-of-{:05d}{}'.format(self.name, i, num_shards, self.ext)))
+
+    def remove_old_files(self):
+        # files of an earlier run with other shard options would be read along with the new ones
+        prefix = os.path.join(glob.escape(self.dest), glob.escape(self.name))
+        ext = glob.escape(self.ext)
+        for pattern in [prefix + ext, prefix + '-*-of-*' + ext, prefix + '-*' + ext + '.tmp']:
+            for filename in glob.glob(pattern):
+                os.remove(filename)
+
+    def open_shard(self, filename: str):
+        self.filenames.append(filename)
+        self.writers.append(TFRecordWriter(filename))
+        self.shard_bytes = 0
+
+    def write(self, record: bytes):
+        size = len(record) + RECORD_OVERHEAD
+        if self.max_shard_bytes is not None:
+            if self.shard_bytes > 0 and self.shard_bytes + size > self.max_shard_bytes:
+                self.writers[-1].close()
+                self.open_shard(os.path.join(
+                    self.dest, '{}-{:05d}{}.tmp'.format(self.name, len(self.filenames), self.ext)))
+            writer = self.writers[-1]
+        else:
+            writer = self.writers[self.num_records % len(self.writers)]
+        with profiler.stage("write", items=1, nbytes=size):
+            writer.write(record)
+        self.shard_bytes += size
+        self.num_records += 1
+        self.num_bytes += size
+
+    def close(self) -> dict:
+        for w in self.writers:
+            w.close()
+        if self.max_shard_bytes is not None:
+            # now we know the total, rename to <name>-0000i-of-0000N<ext>
+            total = len(self.filenames)
+            filenames = []
+            for i, tmp in enumerate(self.filenames):
+                filename = os.path.join(self.dest, '{}-{:05d}-of-{:05d}{}'.format(self.name, i, total, self.ext))
+                os.replace(tmp, filename)
+                filenames.append(filename)
+            self.filenames = filenames
+        return self.summary()
+
+    def abort(self):
+        # a failed run leaves no partial shards behind
+        for w in self.writers:
+            w.close()
+        for filename in self.filenames:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def summary(self) -> dict:
+        return {
+            'examples': self.num_records,
+            'bytes': self.num_bytes,
+            'shards': len(self.filenames),
+            'files': [os.path.basename(f) for f in self.filenames],
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
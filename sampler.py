@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : sampler.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:20
+# @Desc  : Negative sampling over integer question ids
+
+import numpy as np
+
+
+class NegativeSampler(object):
+    """
+    Sample distinct question ids from [0, num_question) without replacement,
+    excluding a given set of ids. Rejection sampling is used while the exclusion
+    set is small, an exclusion mask otherwise, so a draw costs O(k) in the common case
+    instead of O(num_question).
+    """
+
+    def __init__(self, num_question: int, seed=None):
+        self.num_question = num_question
+        # seed may be an int or a sequence of ints, e.g. [seed, shard]
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self, k: int, exclude: set) -> list:
+        available = self.num_question - len(exclude)
+        if k > available:
+            raise ValueError("sample larger than population ({} > {})".format(k, available))
+        if k == 0:
+            return []
+
+        if 2 * (k + len(exclude)) > self.num_question:
+            # dense case, rejection would mostly hit excluded or chosen ids
+            mask = np.ones(self.num_question, dtype=bool)
+            mask[list(exclude)] = False
+            return self.rng.choice(np.flatnonzero(mask), size=k, replace=False).tolist()
+
+        chosen = []
+        seen = set(exclude)
+        while len(chosen) < k:
+            for x in self.rng.integers(0, self.num_question, size=2 * (k - len(chosen))).tolist():
+                if x not in seen:
+                    seen.add(x)
+                    chosen.append(x)
+                    if len(chosen) == k:
+                        break
+        return chosen
@@ -7,14 +7,184 @@
 
 import os
 import re
+import json
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
 
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
+
+from profiler import profiler
+
+
+class InvalidResponseError(Exception):
+    pass
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket whose rate can be changed on the fly."""
+
+    def __init__(self, rate: float, capacity=1.0):
+        assert rate > 0 and capacity >= 1.0
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, now: float):
+        # lock must be held by caller
+        if now > self.last:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def set_rate(self, rate: float):
+        with self.lock:
+            self.refill(time.monotonic())
+            self.rate = rate
+
+    def pause(self, seconds: float):
+        # no tokens are handed out until the pause is over
+        with self.lock:
+            self.refill(time.monotonic())
+            self.tokens = 0.0
+            self.last = max(self.last, time.monotonic() + seconds)
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+                if now >= self.last and self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = max(self.last - now, 0.0) + (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveRateController(object):
+    """
+    AIMD rate control: the request rate grows additively while the server is healthy,
+    and is cut multiplicatively on 429/5xx or slow responses.
+    """
+
+    def __init__(self, initial_rate=2.0, min_rate=0.2, max_rate=10.0,
+                 increase_step=0.2, decrease_factor=0.5,
+                 latency_threshold=2.0, decrease_cooldown=1.0):
+        assert 0 < min_rate <= initial_rate <= max_rate
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_threshold = latency_threshold
+        # concurrent failures caused by the same overload should only cut the rate once
+        self.decrease_cooldown = decrease_cooldown
+        self.last_decrease = 0.0
+        self.bucket = TokenBucket(initial_rate)
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        self.bucket.acquire()
+
+    def decrease(self):
+        # lock must be held by caller
+        now = time.monotonic()
+        if now - self.last_decrease < self.decrease_cooldown:
+            return
+        self.last_decrease = now
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.bucket.set_rate(self.rate)
+
+    def on_success(self, latency: float):
+        with self.lock:
+            if latency > self.latency_threshold:
+                self.decrease()
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+                self.bucket.set_rate(self.rate)
+
+    def on_throttle(self, retry_after=None):
+        with self.lock:
+            self.decrease()
+        if retry_after is not None:
+            self.bucket.pause(retry_after)
+
+
+class RetryPolicy(object):
+    def __init__(self, max_retries=5, base_delay=0.5, max_delay=60.0,
+                 retry_status=(429, 500, 502, 503, 504)):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_status = set(retry_status)
+
+    def get_delay(self, attempt: int, retry_after=None) -> float:
+        # exponential backoff with full jitter, never shorter than Retry-After
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def parse_retry_after(value):
+    # Retry-After is either delta-seconds or an HTTP-date
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_valid_question_doc(doc, title_slug: str) -> bool:
+    if not isinstance(doc, dict) or not isinstance(doc.get('data'), dict):
+        return False
+    question = doc['data'].get('question')
+    return isinstance(question, dict) and question.get('titleSlug') == title_slug and 'content' in question
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that counts the connections opened by its pools."""
+
+    def __init__(self, *args, **kwargs):
+        # must be ready before HTTPAdapter.__init__ calls init_poolmanager
+        self.lock = threading.Lock()
+        self.num_connections = 0
+        super(CountingHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def on_connect(self):
+        with self.lock:
+            self.num_connections += 1
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(CountingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        def make_pool_cls(pool_cls):
+            class CountingConnection(pool_cls.ConnectionCls):
+                def connect(self):
+                    adapter.on_connect()
+                    return super(CountingConnection, self).connect()
+
+            return type('Counting' + pool_cls.__name__, (pool_cls,), {'ConnectionCls': CountingConnection})
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: make_pool_cls(pool_cls)
+            for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
 
 
 class Spider(object):
-    def __init__(self):
-        self.base_url = "https://leetcode.com/"
+    def __init__(self, base_url="https://leetcode.com/", pool_size=10,
+                 rate_controller=None, retry_policy=None, timeout=30.0):
+        self.base_url = base_url
         self.api = {
             'graphql': {
                 'method': 'POST',
@@ -36,6 +206,23 @@ class Spider(object):
         }
         self.html_cleaner = re.compile('<.*?>')
 
+        # load payload template once
+        with open(os.path.join(self.payload_data_path, 'question_data.txt'), "r") as f:
+            self.question_data_template = f.read()
+        self.question_fields = self.get_question_fields(self.question_data_template)
+
+        # keep-alive connection pool shared by all requests
+        self.adapter = CountingHTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.num_requests = 0
+        self.session = requests.Session()
+        self.session.headers.update(self.headers_dict)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self.rate_controller = rate_controller if rate_controller is not None else AdaptiveRateController()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.timeout = timeout
+
     def get_api_url(self, api_name: str) -> str:
         return self.base_url + self.api[api_name]['endpoint']
 
@@ -43,27 +230,137 @@ class Spider(object):
         return self.api[api_name]['method']
 
     def get_question_data_payload(self, title_slug: str) -> str:
-        f = open(
-            os.path.join(self.payload_data_path, 'question_data.txt'),
-            "r"
+        return self.question_data_template % title_slug
+
+    @staticmethod
+    def get_question_fields(template: str) -> str:
+        # extract the "{ ... }" selection set of question(...) from the payload template
+        query = json.loads(template % "")['query']
+        start = query.index('{', query.index('question('))
+        depth = 0
+        for i in range(start, len(query)):
+            if query[i] == '{':
+                depth += 1
+            elif query[i] == '}':
+                depth -= 1
+                if depth == 0:
+                    return query[start:i + 1]
+        raise ValueError("unbalanced question selection in payload template")
+
+    def get_question_data_batch_payload(self, title_slugs: list) -> str:
+        # one aliased question(...) selection per slug: q0, q1, ...
+        var_defs = ', '.join(['$s{}: String!'.format(i) for i in range(len(title_slugs))])
+        selections = '\n'.join(['  q{}: question(titleSlug: $s{}) {}'.format(i, i, self.question_fields)
+                                for i in range(len(title_slugs))])
+        return json.dumps({
+            'operationName': 'questionDataBatch',
+            'variables': {'s{}'.format(i): slug for i, slug in enumerate(title_slugs)},
+            'query': 'query questionDataBatch({}) {{\n{}\n}}\n'.format(var_defs, selections),
+        })
+
+    def send(self, api_name: str, **kwargs) -> Response:
+        with self.adapter.lock:
+            self.num_requests += 1
+        return self.session.request(
+            self.get_api_method(api_name),
+            self.get_api_url(api_name),
+            timeout=self.timeout,
+            **kwargs
         )
-        data = f.read()
-        f.close()
-        return data % title_slug
+
+    def request(self, api_name: str, **kwargs) -> Response:
+        """
+        Send a rate-controlled request, retrying on network errors and retryable status codes.
+        The last response is returned once retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            self.rate_controller.acquire()
+            start = time.monotonic()
+            retry_after = None
+            try:
+                response = self.send(api_name, **kwargs)
+                profiler.record_latency("http " + api_name, time.monotonic() - start)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.rate_controller.on_throttle()
+                if attempt >= self.retry_policy.max_retries:
+                    raise
+                print('request failed ({}), retrying'.format(e))
+            else:
+                if response.status_code not in self.retry_policy.retry_status:
+                    # only healthy responses speed up, e.g. 403/404 leave the rate as it is
+                    if 200 <= response.status_code < 300:
+                        self.rate_controller.on_success(time.monotonic() - start)
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                self.rate_controller.on_throttle(retry_after)
+                if attempt >= self.retry_policy.max_retries:
+                    return response
+                print('got status {}, retrying'.format(response.status_code))
+            time.sleep(self.retry_policy.get_delay(attempt, retry_after))
+            attempt += 1
+
+    @staticmethod
+    def parse_response(response: Response) -> dict:
+        if response.status_code != 200:
+            raise InvalidResponseError('unexpected status {}'.format(response.status_code))
+        try:
+            doc = response.json()
+        except ValueError:
+            raise InvalidResponseError('response is not valid json')
+        if not isinstance(doc, dict) or not isinstance(doc.get('data'), dict):
+            raise InvalidResponseError('response has no data: {}'.format(response.text[:200]))
+        return doc
+
+    @staticmethod
+    def parse_list_response(response: Response) -> dict:
+        # problem list, validated before it is saved as the baseline of the next sync
+        if response.status_code != 200:
+            raise InvalidResponseError('unexpected status {}'.format(response.status_code))
+        try:
+            doc = response.json()
+        except ValueError:
+            raise InvalidResponseError('response is not valid json')
+        if not isinstance(doc, dict) or not isinstance(doc.get('stat_status_pairs'), list):
+            raise InvalidResponseError('response has no stat_status_pairs: {}'.format(response.text[:200]))
+        return doc
 
     def get_question_data(self, title_slug) -> Response:
-        response = requests.request(
-            self.get_api_method("graphql"),
-            self.get_api_url("graphql"),
-            data=self.get_question_data_payload(title_slug),
-            headers=self.headers_dict
-        )
-        return response
+        return self.request("graphql", data=self.get_question_data_payload(title_slug))
+
+    def get_question_data_batch(self, title_slugs: list) -> list:
+        """
+        Fetch several questions with one aliased GraphQL query.
+        Returns one {'data': {'question': ...}} document per slug, in the same order.
+        """
+        response = self.request("graphql", data=self.get_question_data_batch_payload(title_slugs))
+        data = self.parse_response(response)['data']
+        return [{'data': {'question': data['q{}'.format(i)]}} for i in range(len(title_slugs))]
+
+    def get_question_texts(self, title_slugs: list) -> list:
+        """
+        Raw json text of each question with one request, validated so that error bodies
+        never reach the result set. Invalid questions are None.
+        Raises InvalidResponseError if the whole response is unusable.
+        """
+        if len(title_slugs) == 1:
+            response = self.get_question_data(title_slugs[0])
+            doc = self.parse_response(response)
+            return [response.text if is_valid_question_doc(doc, title_slugs[0]) else None]
+        docs = self.get_question_data_batch(title_slugs)
+        return [json.dumps(d) if is_valid_question_doc(d, slug) else None
+                for d, slug in zip(docs, title_slugs)]
 
     def get_question_list(self) -> Response:
-        response = requests.request(
-            self.get_api_method("question_all"),
-            self.get_api_url("question_all"),
-            headers=self.headers_dict
-        )
-        return response
+        return self.request("question_all")
+
+    def get_connection_stats(self) -> dict:
+        opened = self.adapter.num_connections
+        return {
+            'requests': self.num_requests,
+            'opened': opened,
+            'reused': max(self.num_requests - opened, 0),
+        }
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : stats_index.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:44
+# @Desc  : Per-question statistics index, kept next to the raw store for visualize_data and stats
+
+import os
+import json
+import hashlib
+
+from store import RawStore
+
+STATS_INDEX_FILENAME = "_stats_index.json"
+STATS_INDEX_VERSION = 1
+
+# fields of an entry
+SLUG = 0
+SHA1 = 1
+PAID = 2
+TAG_IDS = 3
+SIM_COUNT = 4
+CONTENT_LENGTH = 5
+TOKEN_COUNT = 6
+
+
+def get_sha1(text: str) -> str:
+    # same digest as the fetch manifest
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class StatsIndex(object):
+    """
+    question_id -> [slug, sha1 of the raw json, paid, tag ids, number of similar questions,
+    content length, token count]. The token count is known once convert_data has tokenized
+    the question and is None before. Small enough to load in milliseconds, so reports
+    never need to parse the raw json again.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.tags = []  # tag id -> tag slug, ids are given in order of appearance
+        self.tag2id = dict()
+        self.entries = dict()
+        if filename is not None and os.path.exists(filename):
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        with open(self.filename, "r") as f:
+            data = json.load(f)
+        if data['version'] != STATS_INDEX_VERSION:
+            # rebuilt from the store by refresh()
+            return
+        self.tags = data['tags']
+        self.tag2id = {t: i for i, t in enumerate(self.tags)}
+        self.entries = {entry[0]: entry[1:] for entry in data['questions']}
+
+    def save(self, filename=None):
+        filename = self.filename if filename is None else filename
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, "w") as f:
+            json.dump({
+                'version': STATS_INDEX_VERSION,
+                'tags': self.tags,
+                'questions': [[qid] + entry for qid, entry in sorted(self.entries.items())],
+            }, f, separators=(',', ':'))
+        os.replace(tmp_filename, filename)
+
+    def get_tag_id(self, slug: str) -> int:
+        tid = self.tag2id.get(slug)
+        if tid is None:
+            tid = len(self.tags)
+            self.tags.append(slug)
+            self.tag2id[slug] = tid
+        return tid
+
+    def put(self, question_id: int, text: str, question=None):
+        # index one raw question json, as fetched into the store; question is the parsed
+        # question field of text when the caller already has it
+        sha1 = get_sha1(text)
+        old = self.entries.get(question_id)
+        if old is not None and old[SHA1] == sha1:
+            return
+        if question is None:
+            question = json.loads(text)['data']['question']
+        self.entries[question_id] = [
+            question['titleSlug'],
+            sha1,
+            bool(question['isPaidOnly']),
+            [self.get_tag_id(t['slug']) for t in question['topicTags'] or []],
+            len(json.loads(question['similarQuestions'] or "[]")),
+            len(question['content'] or ""),
+            None,
+        ]
+
+    def remove(self, question_id: int):
+        self.entries.pop(question_id, None)
+
+    def refresh(self, store: RawStore, sha1s=None) -> int:
+        """
+        Bring the index up to date with the store: questions missing from the index are
+        indexed, questions no longer in the store are dropped. sha1s is an optional
+        {question_id: sha1} of the fetch manifest, questions fetched again since they
+        were indexed are indexed again. Returns the number of changed entries.
+        """
+        question_ids = set(store.question_ids())
+        cnt = 0
+        for qid in list(self.entries.keys()):
+            if qid not in question_ids:
+                self.remove(qid)
+                cnt += 1
+        for qid in sorted(question_ids):
+            entry = self.entries.get(qid)
+            if entry is None or (sha1s is not None and sha1s.get(qid, entry[SHA1]) != entry[SHA1]):
+                self.put(qid, store.get(qid))
+                cnt += 1
+        return cnt
+
+    def set_token_counts(self, token_counts: dict) -> int:
+        # {slug: number of tokens} of the questions tokenized by convert_data
+        cnt = 0
+        for entry in self.entries.values():
+            c = token_counts.get(entry[SLUG])
+            if c is not None and entry[TOKEN_COUNT] != c:
+                entry[TOKEN_COUNT] = c
+                cnt += 1
+        return cnt
+
+    def summary(self) -> dict:
+        free = [e for e in self.entries.values() if not e[PAID]]
+        sim_counts = [e[SIM_COUNT] for e in free if e[SIM_COUNT] > 0]
+        sim_distribution = {str(i): 0 for i in range(1, 5)}
+        sim_distribution['>=5'] = 0
+        for c in sim_counts:
+            sim_distribution[str(c) if c < 5 else '>=5'] += 1
+        tag_counts = [0] * len(self.tags)
+        for e in free:
+            for tid in e[TAG_IDS]:
+                tag_counts[tid] += 1
+        tags = dict()
+        # most used first
+        for tid in sorted(range(len(self.tags)), key=lambda i: (-tag_counts[i], self.tags[i])):
+            if tag_counts[tid] > 0:
+                tags[self.tags[tid]] = tag_counts[tid]
+        content_lengths = [e[CONTENT_LENGTH] for e in free]
+        token_counts = [e[TOKEN_COUNT] for e in free if e[TOKEN_COUNT] is not None]
+        return {
+            'questions': len(self.entries),
+            'free_questions': len(free),
+            'paid_questions': len(self.entries) - len(free),
+            'questions_with_similar': len(sim_counts),
+            'similar_count_distribution': sim_distribution,
+            'tags': tags,
+            'content_length': {
+                'mean': sum(content_lengths) / len(content_lengths) if content_lengths else None,
+                'max': max(content_lengths) if content_lengths else None,
+            },
+            'token_count': {
+                'questions': len(token_counts),
+                'mean': sum(token_counts) / len(token_counts) if token_counts else None,
+                'max': max(token_counts) if token_counts else None,
+            },
+        }
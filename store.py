@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : store.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:13
+# @Desc  : Raw question stores shared by the spider and the loaders
+
+import os
+import json
+import sqlite3
+
+STORE_TYPES = ["dir", "sqlite"]
+SQLITE_STORE_FILENAME = "raw.sqlite3"
+
+
+class RawStore(object):
+    """Key-value store of raw question json text, keyed by question_id."""
+
+    def put(self, question_id: int, slug: str, text: str):
+        raise NotImplementedError
+
+    def get(self, question_id: int) -> str:
+        raise NotImplementedError
+
+    def has(self, question_id: int) -> bool:
+        raise NotImplementedError
+
+    def question_ids(self) -> list:
+        raise NotImplementedError
+
+    def iter_texts(self):
+        # yields raw json text of every question
+        for _, text in self.iter_items():
+            yield text
+
+    def iter_items(self):
+        # yields (question_id, raw json text) of every question
+        raise NotImplementedError
+
+    def __len__(self):
+        return len(self.question_ids())
+
+    def close(self):
+        pass
+
+
+class DirStore(RawStore):
+    """One <question_id>.json file per question, the original layout of result/."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def get_filename(self, question_id: int) -> str:
+        return os.path.join(self.path, str(question_id) + '.json')
+
+    def put(self, question_id: int, slug: str, text: str):
+        with open(self.get_filename(question_id), 'w') as f:
+            f.write(text)
+
+    def get(self, question_id: int) -> str:
+        with open(self.get_filename(question_id), 'r') as f:
+            return f.read()
+
+    def has(self, question_id: int) -> bool:
+        return os.path.isfile(self.get_filename(question_id))
+
+    def question_ids(self) -> list:
+        return [int(f[:-len('.json')]) for f in os.listdir(self.path)
+                if f.endswith('.json') and f[:-len('.json')].isdigit()]
+
+    def iter_items(self):
+        for question_id in self.question_ids():
+            yield question_id, self.get(question_id)
+
+
+class SqliteStore(RawStore):
+    """All questions in a single sqlite database file."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        # WAL keeps per-question commits cheap while staying crash safe
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS raw ("
+                          "question_id INTEGER PRIMARY KEY, "
+                          "slug TEXT NOT NULL, "
+                          "text TEXT NOT NULL)")
+        self.conn.commit()
+
+    def put(self, question_id: int, slug: str, text: str, commit=True):
+        self.conn.execute("INSERT OR REPLACE INTO raw (question_id, slug, text) VALUES (?, ?, ?)",
+                          (question_id, slug, text))
+        if commit:
+            self.conn.commit()
+
+    def get(self, question_id: int) -> str:
+        row = self.conn.execute("SELECT text FROM raw WHERE question_id = ?", (question_id,)).fetchone()
+        if row is None:
+            raise KeyError(question_id)
+        return row[0]
+
+    def has(self, question_id: int) -> bool:
+        return self.conn.execute("SELECT 1 FROM raw WHERE question_id = ?", (question_id,)).fetchone() is not None
+
+    def question_ids(self) -> list:
+        return [row[0] for row in self.conn.execute("SELECT question_id FROM raw ORDER BY question_id")]
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM raw").fetchone()[0]
+
+    def iter_items(self):
+        for row in self.conn.execute("SELECT question_id, text FROM raw ORDER BY question_id"):
+            yield row[0], row[1]
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def open_store(store_type: str, result_path: str) -> RawStore:
+    assert store_type in STORE_TYPES
+    if store_type == "dir":
+        return DirStore(result_path)
+    if not os.path.exists(result_path):
+        os.makedirs(result_path)
+    return SqliteStore(os.path.join(result_path, SQLITE_STORE_FILENAME))
+
+
+def migrate_store(src: DirStore, dest: SqliteStore) -> int:
+    # copy every question of a result/ directory into a sqlite store
+    cnt = 0
+    for question_id in src.question_ids():
+        text = src.get(question_id)
+        slug = json.loads(text)['data']['question']['titleSlug']
+        dest.put(question_id, slug, text, commit=False)
+        cnt += 1
+    dest.commit()
+    return cnt
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : stub_server.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:05
+# @Desc  : Local stub of the LeetCode api, for testing the spider offline
+
+import argparse
+import json
+import re
+import time
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_question(question_id: int) -> dict:
+    slug = "stub-question-{}".format(question_id)
+    return {
+        'questionId': str(question_id),
+        'questionFrontendId': str(question_id),
+        'title': "Stub Question {}".format(question_id),
+        'titleSlug': slug,
+        'content': "<p>Given an array <code>nums</code>, return the answer of question {}.</p>".format(
+            question_id),
+        'isPaidOnly': question_id % 7 == 0,
+        'difficulty': "Easy",
+        'similarQuestions': json.dumps([
+            {'title': "Stub Question {}".format(question_id + 1),
+             'titleSlug': "stub-question-{}".format(question_id + 1),
+             'difficulty': "Easy"}
+        ]),
+        'topicTags': [{'name': "Array", 'slug': "array", 'translatedName': None, '__typename': "TopicTagNode"}],
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # filled in by serve()
+    questions = {}
+    latency = 0.0
+    error_rate = 0.0
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path.rstrip('/') != '/api/problems/all':
+            self.send_json({'error': 'not found'}, status=404)
+            return
+        self.send_json({
+            'num_total': len(self.questions),
+            'stat_status_pairs': [
+                {'stat': {'question_id': int(q['questionId']),
+                          'question__title_slug': q['titleSlug'],
+                          'frontend_question_id': int(q['questionFrontendId'])},
+                 'paid_only': q['isPaidOnly'],
+                 'difficulty': {'level': 1},
+                 'status': None}
+                for q in self.questions.values()
+            ],
+        })
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if random.random() < self.error_rate:
+            # simulate rate limiting
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path.rstrip('/') != '/graphql':
+            self.send_json({'error': 'not found'}, status=404)
+            return
+        variables = payload['variables']
+        # aliased batch query: "q0: question(titleSlug: $s0) {...}"
+        aliases = re.findall(r'(\w+): question\(titleSlug: \$(\w+)\)', payload['query'])
+        if len(aliases) == 0:
+            self.send_json({'data': {'question': self.questions.get(variables['titleSlug'])}})
+        else:
+            self.send_json({'data': {alias: self.questions.get(variables[var]) for alias, var in aliases}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8000, questions=None, latency=0.0, error_rate=0.0) -> ThreadingHTTPServer:
+    # questions is a list of question fields, port 0 picks a free port
+    StubHandler.questions = {q['titleSlug']: q for q in questions}
+    StubHandler.latency = latency
+    StubHandler.error_rate = error_rate
+    return ThreadingHTTPServer((host, port), StubHandler)
+
+
+def serve(host="127.0.0.1", port=8000, num_question=100, latency=0.0, error_rate=0.0, synthetic=False):
+    if synthetic:
+        from synthetic import make_question as make_synthetic_question
+        questions = [make_synthetic_question(i, num_question) for i in range(1, num_question + 1)]
+    else:
+        questions = [make_question(i) for i in range(1, num_question + 1)]
+    server = make_server(host, port, questions, latency=latency, error_rate=error_rate)
+    print("stub server listening on http://{}:{}/".format(host, port))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--num_question", type=int, default=100)
+    parser.add_argument("--latency", help="Seconds to sleep before each response", type=float, default=0.0)
+    parser.add_argument("--error_rate", help="Fraction of graphql requests answered with 429", type=float,
+                        default=0.0)
+    parser.add_argument("--synthetic", help="Serve the realistic questions of synthetic.py", action="store_true")
+    args = parser.parse_args()
+    serve(host=args.host, port=args.port, num_question=args.num_question, latency=args.latency,
+          error_rate=args.error_rate, synthetic=args.synthetic)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : sync.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:12
+# @Desc  : Incremental sync of the problem list against the local store
+
+
+def get_list_metadata(pair: dict) -> tuple:
+    # list-level fields that indicate a question changed,
+    # volatile counters such as total_acs are left out on purpose
+    stat = pair['stat']
+    return (
+        stat.get('question__title'),
+        stat.get('frontend_question_id'),
+        stat.get('question__hide'),
+        pair.get('paid_only'),
+        pair.get('status'),
+        (pair.get('difficulty') or {}).get('level'),
+    )
+
+
+def diff_question_lists(old_pairs: list, new_pairs: list, local_slugs: set) -> dict:
+    """
+    Compare two stat_status_pairs lists.
+    A question is "added" if it is not in the local store, "changed" if its list
+    metadata differs from the old list, "unchanged" otherwise. Questions that disappeared
+    from the remote list are reported as "removed".
+    Returns a dict of lists of (question_id, title_slug).
+    """
+    old_metadata = {p['stat']['question__title_slug']: get_list_metadata(p) for p in old_pairs}
+    rst = {'added': [], 'changed': [], 'unchanged': [], 'removed': []}
+    new_slugs = set()
+    for p in new_pairs:
+        slug = p['stat']['question__title_slug']
+        new_slugs.add(slug)
+        item = (p['stat']['question_id'], slug)
+        if slug not in local_slugs:
+            rst['added'].append(item)
+        elif slug not in old_metadata or old_metadata[slug] != get_list_metadata(p):
+            rst['changed'].append(item)
+        else:
+            rst['unchanged'].append(item)
+    for p in old_pairs:
+        slug = p['stat']['question__title_slug']
+        if slug not in new_slugs:
+            rst['removed'].append((p['stat']['question_id'], slug))
+    return rst
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : synthetic.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:30
+# @Desc  : Deterministic synthetic LeetCode corpus for benchmarks and the stub server
+
+import json
+import random
+import argparse
+
+from store import STORE_TYPES, RawStore, SqliteStore, open_store
+
+TOPIC_TAGS = [
+    ("Array", "array"), ("String", "string"), ("Hash Table", "hash-table"), ("Math", "math"),
+    ("Dynamic Programming", "dynamic-programming"), ("Sorting", "sorting"), ("Greedy", "greedy"),
+    ("Depth-First Search", "depth-first-search"), ("Breadth-First Search", "breadth-first-search"),
+    ("Binary Search", "binary-search"), ("Tree", "tree"), ("Two Pointers", "two-pointers"),
+    ("Bit Manipulation", "bit-manipulation"), ("Stack", "stack"), ("Heap", "heap"), ("Graph", "graph"),
+    ("Linked List", "linked-list"), ("Backtracking", "backtracking"), ("Design", "design"),
+    ("Sliding Window", "sliding-window"), ("Union Find", "union-find"), ("Trie", "trie"),
+]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+WORDS = (
+    "given an array of integers nums and an integer target return indices the two numbers such that they add up "
+    "you may assume each input would have exactly one solution not use same element twice can answer in any order "
+    "string s find length longest substring without repeating characters binary tree root node value "
+    "linked list head reverse merge sorted lists return new should be made by splicing together nodes "
+    "matrix grid m x n rows columns path from top left to bottom right minimum sum only move down or right "
+    "design a data structure that supports following operations get put capacity least recently used cache "
+    "is valid if open brackets must closed same type correct order every close bracket has corresponding "
+    "number of ways distinct subsequences modulo 10^9 + 7 since answer may be very large"
+).split()
+SYLLABLES = ["ar", "ra", "y", "tre", "e", "no", "de", "pa", "th", "in", "te", "ger", "sub", "se", "q", "ma",
+             "trix", "lo", "op", "ca", "che", "he", "ap", "gra", "ph", "ze", "ro", "un", "ion", "fi", "nd"]
+NAMES = ["nums", "target", "s", "root", "head", "grid", "k", "n", "matrix", "words", "intervals", "edges"]
+UNICODE_WORDS = ["≤", "—", "é", "中文", "α", "→"]
+
+
+def make_rare_words(num_word=20000, seed=0) -> list:
+    # long tail of made up words, so the vocabulary grows with the corpus like a real one
+    r = random.Random(seed)
+    return ["".join([r.choice(SYLLABLES) for _ in range(r.randint(2, 5))]) for _ in range(num_word)]
+
+
+RARE_WORDS = make_rare_words()
+
+
+def make_sentence(r: random.Random, num_word: int) -> str:
+    words = []
+    for _ in range(num_word):
+        x = r.random()
+        if x < 0.05:
+            # zipf-like, a few rare words are much more frequent than the rest
+            words.append(RARE_WORDS[int(len(RARE_WORDS) * r.random() ** 3)])
+        elif x < 0.08:
+            words.append("<code>{}</code>".format(r.choice(NAMES)))
+        elif x < 0.12:
+            words.append(str(r.randint(0, 10 ** r.randint(1, 9))))
+        elif x < 0.13:
+            words.append(r.choice(UNICODE_WORDS))
+        elif x < 0.15:
+            words.append("<strong>{}</strong>".format(r.choice(WORDS)))
+        else:
+            words.append(r.choice(WORDS))
+    return " ".join(words).capitalize() + "."
+
+
+def make_content(r: random.Random, size: float) -> str:
+    # description, examples with <pre> blocks, constraints list, roughly like leetcode.com
+    parts = []
+    for _ in range(max(1, int(r.randint(1, 4) * size))):
+        parts.append("<p>{}</p>\n".format(" ".join([make_sentence(r, r.randint(5, 25))
+                                                    for _ in range(r.randint(1, 3))])))
+    parts.append("\n<p>&nbsp;</p>\n")
+    for i in range(r.randint(1, 3)):
+        values = ",".join([str(r.randint(-100, 100)) for _ in range(r.randint(1, 12))])
+        parts.append("<p><strong>Example {}:</strong></p>\n\n<pre>\n"
+                     "<strong>Input:</strong> {} = [{}], {} = {}\n"
+                     "<strong>Output:</strong> {}\n"
+                     "<strong>Explanation:</strong> {}\n</pre>\n\n".format(
+                         i + 1, r.choice(NAMES), values, r.choice(NAMES), r.randint(0, 100),
+                         r.randint(0, 100), make_sentence(r, r.randint(3, 15))))
+    parts.append("<p>&nbsp;</p>\n<p><strong>Constraints:</strong></p>\n\n<ul>\n")
+    for _ in range(r.randint(1, 4)):
+        parts.append("\t<li><code>1 &lt;= {}.length &lt;= 10<sup>{}</sup></code></li>\n".format(
+            r.choice(NAMES), r.randint(2, 5)))
+    parts.append("</ul>\n")
+    return "".join(parts)
+
+
+def get_slug(question_id: int) -> str:
+    return "synthetic-question-{}".format(question_id)
+
+
+def make_question(question_id: int, num_question: int, seed=0, size=1.0) -> dict:
+    """
+    Question field of a {'data': {'question': ...}} document, deterministic in
+    (question_id, seed) and independent of the other questions.
+    size scales the length of the content.
+    """
+    r = random.Random("{}-{}".format(seed, question_id))
+    tags = r.sample(TOPIC_TAGS, r.randint(0, 4))
+    sim_qs = []
+    for _ in range(r.choice([0, 0, 1, 1, 2, 3, 5])):
+        # a few similar questions point outside of the corpus, like paid or removed ones
+        sim_id = r.randint(1, int(num_question * 1.05) + 1)
+        sim_qs.append({'title': "Synthetic Question {}".format(sim_id),
+                       'titleSlug': get_slug(sim_id),
+                       'difficulty': r.choice(DIFFICULTIES),
+                       'translatedTitle': None})
+    return {
+        'questionId': str(question_id),
+        'questionFrontendId': str(question_id),
+        'title': "Synthetic Question {}".format(question_id),
+        'titleSlug': get_slug(question_id),
+        'content': make_content(r, size),
+        'isPaidOnly': r.random() < 0.15,
+        'difficulty': r.choice(DIFFICULTIES),
+        'similarQuestions': json.dumps(sim_qs),
+        'topicTags': [{'name': name, 'slug': slug, 'translatedName': None, '__typename': "TopicTagNode"}
+                      for name, slug in tags],
+    }
+
+
+def iter_corpus(num_question: int, seed=0, size=1.0):
+    # question ids start from 1 like leetcode
+    for question_id in range(1, num_question + 1):
+        yield {'data': {'question': make_question(question_id, num_question, seed=seed, size=size)}}
+
+
+def generate_corpus(num_question: int, seed=0, size=1.0) -> list:
+    return list(iter_corpus(num_question, seed=seed, size=size))
+
+
+def write_corpus(store: RawStore, num_question: int, seed=0, size=1.0) -> int:
+    # fill a raw store the way fetch_data would, sqlite commits once at the end
+    for q in iter_corpus(num_question, seed=seed, size=size):
+        question = q['data']['question']
+        if isinstance(store, SqliteStore):
+            store.put(int(question['questionId']), question['titleSlug'], json.dumps(q), commit=False)
+        else:
+            store.put(int(question['questionId']), question['titleSlug'], json.dumps(q))
+    if isinstance(store, SqliteStore):
+        store.commit()
+    return num_question
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dest", help="Set result directory to write the corpus to", type=str)
+    parser.add_argument("--num_question", "-n", help="Set number of questions. Default: 1000", type=int,
+                        default=1000)
+    parser.add_argument("--seed", help="Set random seed. Default: 0", type=int, default=0)
+    parser.add_argument("--size", help="Set content length factor. Default: 1.0", type=float, default=1.0)
+    parser.add_argument("--store", "-s", help="Set raw store type. Default: dir", type=str, default="dir",
+                        choices=STORE_TYPES)
+    args = parser.parse_args()
+    store = open_store(args.store, args.dest)
+    print("{} questions written".format(write_corpus(store, args.num_question, seed=args.seed, size=args.size)))
+    store.close()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : tf_util.py
+# @Author: harry
+# @Date  : 19-3-17 下午8:11
+# @Desc  : TensorFlow feature helpers, kept apart from util so only converting imports tf
+
+import tensorflow as tf
+
+
+def tf_bytes_feature(value: list) -> tf.train.Feature:
+    return tf.train.Feature(
+        bytes_list=tf.train.BytesList(value=value)
+    )
+
+
+def tf_int64_feature(value: list) -> tf.train.Feature:
+    return tf.train.Feature(
+        int64_list=tf.train.Int64List(value=value)
+    )
+
+
+def tf_example(features: dict) -> tf.train.Example:
+    # build a tf.train.Example from the {name: (kind, values)} dicts of tfrecord.ExampleEncoder
+    from tfrecord import BYTES, INT64
+    feature = dict()
+    for name, (kind, values) in features.items():
+        assert kind in [BYTES, INT64]
+        feature[name] = tf_bytes_feature(values) if kind == BYTES else tf_int64_feature(values)
+    return tf.train.Example(features=tf.train.Features(feature=feature))
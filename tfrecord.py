@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : tfrecord.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:28
+# @Desc  : tf.train.Example encoder and TFRecord writer without TensorFlow
+
+import struct
+
+import numpy as np
+
+try:
+    # optional C implementation, pip install crc32c
+    from crc32c import crc32c
+except ImportError:
+    crc32c = None
+
+# feature kinds, FEATURE values are already encoded by ExampleEncoder.encode_feature()
+BYTES = 0
+INT64 = 1
+FEATURE = 2
+
+# packed int lists at least this long are encoded with numpy
+NUMPY_MIN_LENGTH = 16
+VARINTS = [bytes([i]) for i in range(0x80)]
+
+
+def make_crc32c_table() -> list:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82f63b78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC32C_TABLE = make_crc32c_table()
+
+
+def crc32c_py(data: bytes) -> int:
+    # slow fallback, used when the crc32c package is not installed
+    table = CRC32C_TABLE
+    crc = 0xffffffff
+    for b in data:
+        crc = table[(crc ^ b) & 0xff] ^ (crc >> 8)
+    return crc ^ 0xffffffff
+
+
+if crc32c is None:
+    crc32c = crc32c_py
+
+
+def masked_crc32c(data: bytes) -> int:
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + 0xa282ead8) & 0xffffffff
+
+
+def encode_varint(value: int) -> bytes:
+    if 0 <= value < 0x80:
+        return VARINTS[value]
+    if value < 0:
+        # int64 is encoded as its 10 bytes two's complement
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def encode_packed_varints(values) -> bytes:
+    if len(values) < NUMPY_MIN_LENGTH:
+        return b''.join([encode_varint(v) for v in values])
+    # one column per 7 bits, a byte is kept while the previous one has its continuation bit set
+    a = np.asarray(values, dtype=np.int64).view(np.uint64)
+    columns = []
+    valid = [np.ones(len(a), dtype=bool)]
+    while True:
+        more = a > 0x7f
+        columns.append((a & np.uint64(0x7f)).astype(np.uint8) | np.where(more, 0x80, 0).astype(np.uint8))
+        if not more.any():
+            break
+        valid.append(more)
+        a = a >> np.uint64(7)
+    return np.stack(columns, axis=1)[np.stack(valid, axis=1)].tobytes()
+
+
+def encode_length_delimited(tag: bytes, payload: bytes) -> bytes:
+    return tag + encode_varint(len(payload)) + payload
+
+
+class ExampleEncoder(object):
+    """
+    Serialize tf.train.Example protobufs from {name: (kind, values)} dicts.
+    Features are written sorted by name, so the output is byte-identical to
+    tf.train.Example(...).SerializeToString(deterministic=True). Without deterministic,
+    protobuf writes map entries in an unspecified order.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.keys = dict()  # name -> encoded key field of the map entry
+
+    @staticmethod
+    def encode_feature(kind: int, values) -> bytes:
+        if kind == FEATURE:
+            return values
+        if kind == BYTES:
+            # Feature.bytes_list (1) of BytesList.value (1)
+            return encode_length_delimited(b'\x0a', b''.join([encode_length_delimited(b'\x0a', v) for v in values]))
+        assert kind == INT64
+        # Feature.int64_list (3) of packed Int64List.value (1)
+        if len(values) == 0:
+            return b'\x1a\x00'
+        return encode_length_delimited(b'\x1a', encode_length_delimited(b'\x0a', encode_packed_varints(values)))
+
+    def encode(self, features: dict) -> bytes:
+        buf = self.buf
+        del buf[:]
+        for name in sorted(features.keys()):
+            kind, values = features[name]
+            key = self.keys.get(name)
+            if key is None:
+                key = encode_length_delimited(b'\x0a', name.encode('utf-8'))
+                self.keys[name] = key
+            feature = self.encode_feature(kind, values)
+            # Features.feature (1) map entry of key (1) and value (2)
+            buf += b'\x0a'
+            buf += encode_varint(len(key) + 1 + len(encode_varint(len(feature))) + len(feature))
+            buf += key
+            buf += b'\x12'
+            buf += encode_varint(len(feature))
+            buf += feature
+        # Example.features (1)
+        return b'\x0a' + encode_varint(len(buf)) + buf
+
+
+class TFRecordWriter(object):
+    """Drop-in for tf.io.TFRecordWriter: uint64 length, masked crc32c of length, data, masked crc32c of data."""
+
+    def __init__(self, filename: str):
+        self.f = open(filename, 'wb')
+
+    def write(self, record: bytes):
+        header = struct.pack('<Q', len(record))
+        self.f.write(header + struct.pack('<I', masked_crc32c(header)))
+        self.f.write(record)
+        self.f.write(struct.pack('<I', masked_crc32c(record)))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def check_round_trip(num_examples=1000, seed=0):
+    # write random examples with TFRecordWriter and read them back with tf.data
+    import os
+    import random
+    import tempfile
+    import tensorflow as tf
+    from tf_util import tf_example
+
+    r = random.Random(seed)
+    ints = [0, 1, 127, 128, 16383, 16384, 2 ** 31 - 1, 2 ** 63 - 1, -1, -2 ** 63]
+    examples = []
+    for i in range(num_examples):
+        features = dict()
+        for j in range(r.randint(0, 6)):
+            if r.random() < 0.5:
+                values = [bytes([r.randrange(256) for _ in range(r.choice([0, 1, 10, 200]))])
+                          for _ in range(r.randint(0, 3))]
+                features['Bytes {}'.format(j)] = (BYTES, values)
+            else:
+                n = r.choice([0, 1, 5, NUMPY_MIN_LENGTH, 300])
+                values = [r.choice(ints + [r.randrange(-2 ** 63, 2 ** 63)]) for _ in range(n)]
+                features['Int64 {}'.format(j)] = (INT64, values)
+        examples.append(features)
+
+    encoder = ExampleEncoder()
+    filename = os.path.join(tempfile.mkdtemp(), 'check.tfrecord')
+    with TFRecordWriter(filename) as writer:
+        for features in examples:
+            record = encoder.encode(features)
+            assert record == tf_example(features).SerializeToString(deterministic=True), features
+            writer.write(record)
+
+    cnt = 0
+    for record, features in zip(tf.data.TFRecordDataset(filename), examples):
+        assert tf.train.Example.FromString(record.numpy()) == tf_example(features)
+        cnt += 1
+    assert cnt == num_examples
+    os.remove(filename)
+
+    data = bytes([r.randrange(256) for _ in range(10000)])
+    assert crc32c(data) == crc32c_py(data) and crc32c_py(b'123456789') == 0xe3069283
+    print("{} examples round-tripped through tf.data.TFRecordDataset".format(cnt))
+
+
+if __name__ == '__main__':
+    check_round_trip()
@@ -5,6 +5,10 @@
 # @Date  : 2019/4/4 下午12:31
 # @Desc  : Yet another tokenizer for leetcode data
 
+import re
+import sys
+import random
+
 
 class Tokenizer(object):
     def __init__(self, raw_str: str):
@@ -43,7 +47,122 @@ class Tokenizer(object):
 
         return tokens
 
+    def iter_tokens(self, with_offsets=False):
+        """
+        Lazily yield the tokens of tokenize(), with with_offsets as (token, start, end)
+        where raw_str[start:end] == token.
+        """
+        raw_str = self.raw_str
+        start = None  # start of the current alpha run
+        for i, c in enumerate(raw_str):
+            if c.isalpha():
+                if start is None:
+                    start = i
+                continue
+            if start is not None:
+                yield (raw_str[start:i], start, i) if with_offsets else raw_str[start:i]
+                start = None
+            if not c.isspace():
+                # special chars
+                yield (c, i, i + 1) if with_offsets else c
+        if start is not None:
+            yield (raw_str[start:], start, len(raw_str)) if with_offsets else raw_str[start:]
+
+
+supplementary_char_pattern = re.compile('[\U00010000-\U0010ffff]')
+# compiled lazily on first use
+token_pattern = None
+
+
+def get_token_pattern():
+    """
+    Regex equivalent of Tokenizer: runs of str.isalpha() chars, or any single non-space char.
+    The alpha class is built from str.isalpha() of the running interpreter so that both
+    tokenizers agree on every code point, and re's \\S matches exactly "not str.isspace()".
+    Only BMP chars are covered: re matches those with a bitmap, while a class with
+    supplementary ranges is scanned linearly and ends up slower than Tokenizer itself.
+    """
+    global token_pattern
+    if token_pattern is None:
+        ranges = []
+        start = None
+        for c in range(0x10000 + 1):
+            is_alpha = c <= 0xffff and chr(c).isalpha()
+            if is_alpha and start is None:
+                start = c
+            elif not is_alpha and start is not None:
+                ranges.append((start, c - 1))
+                start = None
+        alpha_class = ''.join([re.escape(chr(a)) if a == b else re.escape(chr(a)) + '-' + re.escape(chr(b))
+                               for a, b in ranges])
+        token_pattern = re.compile('[' + alpha_class + ']+|\\S')
+    return token_pattern
+
+
+class FastTokenizer(object):
+    """Drop-in replacement of Tokenizer that runs in C via a compiled regex."""
+
+    def __init__(self, raw_str: str):
+        self.raw_str = raw_str
+
+    def tokenize(self) -> list:
+        return tokenize_batch([self.raw_str])[0]
+
+    def iter_tokens(self, with_offsets=False):
+        # same as Tokenizer.iter_tokens
+        if not self.raw_str.isascii() and supplementary_char_pattern.search(self.raw_str) is not None:
+            yield from Tokenizer(self.raw_str).iter_tokens(with_offsets=with_offsets)
+            return
+        for m in get_token_pattern().finditer(self.raw_str):
+            yield (m.group(), m.start(), m.end()) if with_offsets else m.group()
+
+
+def tokenize_batch(docs: list) -> list:
+    # tokenize a list of documents, one token list per document
+    findall = get_token_pattern().findall
+    # the rare text with supplementary chars falls back to Tokenizer
+    return [findall(d) if d.isascii() or supplementary_char_pattern.search(d) is None
+            else Tokenizer(d).tokenize()
+            for d in docs]
+
+
+def random_unicode_text(rng: random.Random, max_length=64) -> str:
+    # mix of ascii, whitespace of all kinds, letters/digits/marks of other scripts and random code points
+    pools = [
+        'abcXYZ',
+        ' \t\n\r\x0b\x0c\x1c\x85\xa0\u2028\u3000',
+        '0123456789.,;:!?()[]{}<>=+-*/_\'"\\',
+        'éßøÆπΩжЯ中文日本語한국어ـالعربية\u0301\u0663²½ǅⅫ',
+    ]
+    chars = []
+    for _ in range(rng.randint(0, max_length)):
+        r = rng.random()
+        if r < 0.1:
+            chars.append(chr(rng.randint(0, 0xffff)))
+        elif r < 0.12:
+            chars.append(chr(rng.randint(0, sys.maxunicode)))
+        else:
+            chars.append(rng.choice(rng.choice(pools)))
+    return ''.join(chars)
+
+
+def check_equivalence(num_cases=10000, seed=0) -> int:
+    # property check: FastTokenizer, tokenize_batch and the token iterators agree with
+    # Tokenizer on random unicode input
+    rng = random.Random(seed)
+    docs = [random_unicode_text(rng) for _ in range(num_cases)]
+    expected = [Tokenizer(d).tokenize() for d in docs]
+    for d, e in zip(docs, expected):
+        assert FastTokenizer(d).tokenize() == e, repr(d)
+        assert list(Tokenizer(d).iter_tokens()) == e, repr(d)
+        offsets = list(FastTokenizer(d).iter_tokens(with_offsets=True))
+        assert offsets == list(Tokenizer(d).iter_tokens(with_offsets=True)), repr(d)
+        assert [d[start:end] for _, start, end in offsets] == e, repr(d)
+    assert tokenize_batch(docs) == expected
+    return num_cases
+
 
 if __name__ == "__main__":
     tokenizer = Tokenizer("    ")
     print(repr(tokenizer.tokenize()))
+    print("{} random cases checked, FastTokenizer is equivalent to Tokenizer".format(check_equivalence()))
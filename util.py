@@ -6,12 +6,14 @@
 # @Desc  : Utils
 
 import lxml.html
+import lxml.etree
 import os
-import tensorflow as tf
-from matplotlib import pyplot as plt
-import numpy as np
+import multiprocessing
 
-plt.rcParams['font.sans-serif'] = ['Microsoft YaHei']  # 解决中文乱码
+# one parser for every clean_text() call, lxml.html builds a new one per document
+HTML_PARSER = lxml.etree.HTMLParser()
+# plain str result, without the parent references of lxml smart strings
+TEXT_CONTENT = lxml.etree.XPath("string()", smart_strings=False)
 
 
 def clean_html(raw: str) -> str:
@@ -20,7 +22,54 @@ def clean_html(raw: str) -> str:
 
 
 def clean_empty_lines(raw: str) -> str:
-    return ' '.join([line.strip() for line in raw.split('\n') if line.strip() != ''])
+    return ' '.join(filter(None, map(str.strip, raw.split('\n'))))
+
+
+def clean_text(raw: str) -> str:
+    """
+    Same as clean_empty_lines(clean_html(raw)): one libxml2 parse with a shared parser
+    and without lxml.html element classes, then clean_empty_lines(). libxml2 stays the
+    parser, its handling of broken html is what defines the text.
+    """
+    document = lxml.etree.fromstring(raw, HTML_PARSER)
+    if document is None:
+        # like lxml.html.document_fromstring
+        raise lxml.etree.ParserError("Document is empty")
+    return clean_empty_lines(TEXT_CONTENT(document))
+
+
+def clean_text_chunk(docs: list) -> list:
+    return [clean_text(d) for d in docs]
+
+
+def clean_text_batch(docs: list, workers=1) -> list:
+    # clean_text() of every document, in order, split over worker processes
+    if workers <= 1 or len(docs) < workers:
+        return clean_text_chunk(docs)
+    chunksize = max(len(docs) // (workers * 4), 1)
+    texts = []
+    with multiprocessing.Pool(workers) as pool:
+        for chunk in pool.map(clean_text_chunk, [docs[i:i + chunksize] for i in range(0, len(docs), chunksize)]):
+            texts.extend(chunk)
+    return texts
+
+
+def check_clean_text(docs: list, workers=1) -> int:
+    # clean_text() and clean_text_batch() must give exactly what clean_html() and clean_empty_lines() give
+    expected = []
+    for d in docs:
+        try:
+            expected.append(' '.join([line.strip() for line in clean_html(d).split('\n') if line.strip() != '']))
+        except lxml.etree.ParserError:
+            expected.append(None)
+    for d, e in zip(docs, expected):
+        try:
+            assert clean_text(d) == e, d
+        except lxml.etree.ParserError:
+            assert e is None, d
+    valid = [d for d, e in zip(docs, expected) if e is not None]
+    assert clean_text_batch(valid, workers=workers) == [e for e in expected if e is not None]
+    return len(docs)
 
 
 def create_dir(name: str):
@@ -28,57 +77,36 @@ def create_dir(name: str):
         os.makedirs(name)
 
 
-def tf_bytes_feature(value: list) -> tf.train.Feature:
-    return tf.train.Feature(
-        bytes_list=tf.train.BytesList(value=value)
-    )
-
-
-def tf_int64_feature(value: list) -> tf.train.Feature:
-    return tf.train.Feature(
-        int64_list=tf.train.Int64List(value=value)
-    )
-
-
-def plot_pie(labels: list, sizes: list, colors: list, explode: list):
-    plt.figure()  # 调节图形大小
-    labels = labels  # 定义标签
-    sizes = sizes  # 每块值
-    colors = colors  # 每块颜色定义 ['red', 'yellowgreen', 'lightskyblue', 'yellow']
-    explode = explode  # 将某一块分割出来，值越大分割出的间隙越大
-    patches, text1, text2 = plt.pie(sizes,
-                                    explode=explode,
-                                    labels=labels,
-                                    colors=colors,
-                                    autopct='%3.2f%%',  # 数值保留固定小数位
-                                    shadow=False,  # 无阴影设置
-                                    startangle=90,  # 逆时针起始角度设置
-                                    pctdistance=0.6)  # 数值距圆心半径倍数距离
-    # patches饼图的返回值，text1饼图外label的文本，text2饼图内部的文本
-    for t in text2:
-        t.set_color('white')
-    # x，y轴刻度设置一致，保证饼图为圆形
-    plt.axis('equal')
-    return plt
-
-
-def plot_bar(labels: list, data: list, xlabel: str, ylabel: str, color='grey'):
-    plt.figure()  # 调节图形大小
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.bar(range(len(data)), data, color=color, tick_label=labels)
-    for xx, yy in zip(range(len(data)), data):
-        plt.text(xx, yy + 0.5, str(yy), ha='center')
-    return plt
-
-
-def plot_loss(steps, max_val, bend=0.03, color='black'):
-    plt.figure()
-    x = np.arange(0, steps, 1)
-    noise1 = np.random.normal(size=len(x))
-    noise2 = np.random.normal(loc=0.5, scale=np.sqrt(0.5), size=len(x)) * np.random.choice([0, 1], len(x), p=[0.9, 0.1])
-    y = max_val * np.exp(-x * bend) + 0.1 * noise1 + 0.5 * noise2
-    plt.xlabel(u'epoch')
-    plt.ylabel(u'loss')
-    plt.plot(x, y, color)
-    return plt
+# broken or unusual html the real corpus may not have
+EDGE_CASES = [
+    "", " \n ", "<!-- only a comment -->", "plain text", "<p>a</p> <p>b</p>", "<p>a</p><p>b</p>",
+    "<div>a</div>\n\n<div>b</div>", "a<br>b", "<pre>\n  a\n\n  b\n</pre>", "<p>a&nbsp;b &lt;= c &amp;&amp; d</p>",
+    "&nbspx &#128; &#0; &foo;", "a\r\nb\rc", "<script>var x = '<p>';</script>y", "<textarea><b>x</b>", "<!-- a > b -->c",
+    "<a title='x>y'>t</a>", "<p>x</p></body></html>trailing", "<head><title>t</title></head>x", "<table>a<tr><td>b",
+    "<![CDATA[x]]>y", "<p\u3000class=x>\u00a0\u2028a</p>", "a < b > c", "<svg><![CDATA[x]]></svg>", "<p",
+]
+
+
+if __name__ == '__main__':
+    import argparse
+    from store import STORE_TYPES, open_store
+    from loader import iter_questions
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", help="Set result directory of fetched questions. Default: result",
+                        type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "result"))
+    parser.add_argument("--store", "-s", help="Set raw store type. Default: dir", type=str, default="dir",
+                        choices=STORE_TYPES)
+    parser.add_argument("--workers", "-w", help="Set number of worker processes. Default: 1", type=int, default=1)
+    args = parser.parse_args()
+
+    docs = list(EDGE_CASES)
+    if os.path.exists(args.path):
+        store = open_store(args.store, args.path)
+        docs.extend([q['data']['question']['content'] for q in iter_questions(store, free_only=True)])
+        store.close()
+    else:
+        from synthetic import generate_corpus
+        print("{} not found, checking a synthetic corpus instead".format(args.path))
+        docs.extend([q['data']['question']['content'] for q in generate_corpus(1000)])
+    print("clean_text matches clean_html on {} documents".format(check_clean_text(docs, workers=args.workers)))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File  : vocab.py
+# @Author: agent
+# @Date  : 2026/10/18 上午7:21
+# @Desc  : Vocabulary with token counts and frequency pruning
+
+import json
+import zlib
+from collections import Counter
+
+PAD = "<PAD>"
+UNK = "<UNK>"
+PAD_ID = 0
+UNK_ID = 1
+VOCAB_TYPES = ["dict", "hashed"]
+
+
+class Vocabulary(object):
+    def __init__(self, counts=None):
+        # token -> number of occurrences in the corpus
+        self.counts = Counter() if counts is None else counts
+        self.word2id = dict()
+        # <UNK> count of a loaded vocabulary, whose pruned words are not known
+        self.unk_count = None
+
+    def __len__(self):
+        return len(self.word2id)
+
+    def count(self, tokens: list):
+        self.counts.update(tokens)
+
+    def build(self, min_count=1, max_size=None) -> dict:
+        """
+        Create word2id from the counted tokens. Words seen less than min_count times,
+        and the least frequent words beyond max_size (special tokens included), are
+        left out and map to <UNK>. Normal ids are assigned in alphabetical order from 2.
+        """
+        assert max_size is None or max_size >= 2
+        words = [w for w, c in self.counts.items() if c >= min_count]
+        if max_size is not None and len(words) > max_size - 2:
+            # most frequent first, ties broken alphabetically so the result is stable
+            words = sorted(words, key=lambda w: (-self.counts[w], w))[:max_size - 2]
+
+        self.word2id.clear()
+        self.unk_count = None
+        # insert special tokens
+        self.word2id[PAD] = PAD_ID
+        self.word2id[UNK] = UNK_ID
+        # normal token id starts from 2
+        wid = 2
+        for w in sorted(words):
+            self.word2id[w] = wid
+            wid += 1
+        return self.word2id
+
+    def get_count(self, word: str) -> int:
+        if word == UNK:
+            if self.unk_count is not None:
+                return self.unk_count
+            # pruned words are counted as <UNK>
+            return sum([c for w, c in self.counts.items() if w not in self.word2id])
+        return self.counts.get(word, 0)
+
+    def encode(self, tokens) -> list:
+        word2id = self.word2id
+        return [word2id.get(t, UNK_ID) for t in tokens]
+
+    def save(self, filename: str):
+        # one "word<TAB>count" line per id, tokens never contain whitespace
+        with open(filename, "w") as f:
+            f.writelines(["{}\t{}\n".format(w, self.get_count(w)) for w in self.word2id.keys()])
+
+    @staticmethod
+    def load(filename: str) -> 'Vocabulary':
+        # the line number is the id, counts are optional so plain word lists load as well
+        vocab = Vocabulary()
+        with open(filename, "r") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line == "":
+                    continue
+                word, _, count = line.partition("\t")
+                vocab.word2id[word] = len(vocab.word2id)
+                if count != "" and word == UNK:
+                    vocab.unk_count = int(count)
+                elif count != "" and word != PAD:
+                    vocab.counts[word] = int(count)
+        assert vocab.word2id.get(PAD) == PAD_ID and vocab.word2id.get(UNK) == UNK_ID
+        return vocab
+
+
+class HashedVocabulary(object):
+    """
+    Feature hashing instead of a word2id dict: a word maps to bucket
+    2 + crc32(utf-8 word) % num_buckets, ids 0 and 1 stay reserved for <PAD> and <UNK>.
+    No counting pass is needed and the mapping is the same in every process and run.
+    """
+
+    hash_function = "crc32"
+
+    def __init__(self, num_buckets: int):
+        assert isinstance(num_buckets, int) and num_buckets > 0
+        self.num_buckets = num_buckets
+        # only the reserved tokens have fixed ids
+        self.word2id = {PAD: PAD_ID, UNK: UNK_ID}
+
+    def __len__(self):
+        return self.num_buckets + 2
+
+    def encode(self, tokens) -> list:
+        num_buckets = self.num_buckets
+        crc32 = zlib.crc32
+        return [2 + crc32(t.encode('utf-8')) % num_buckets for t in tokens]
+
+    def get_params(self) -> dict:
+        return {
+            'type': 'hashed',
+            'hash': self.hash_function,
+            'buckets': self.num_buckets,
+            'offset': 2,
+            'lowercase': True,
+            'special_tokens': [PAD, UNK],
+            'vocab_size': len(self),
+        }
+
+    def save(self, filename: str):
+        with open(filename, "w") as f:
+            json.dump(self.get_params(), f, indent=2)
+
+    @staticmethod
+    def load(filename: str) -> 'HashedVocabulary':
+        with open(filename, "r") as f:
+            params = json.load(f)
+        assert params['type'] == 'hashed' and params['hash'] == HashedVocabulary.hash_function
+        return HashedVocabulary(params['buckets'])